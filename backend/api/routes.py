@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from services.edamam import EdamamService
 from services.openai_service import OpenAIService
+from services.recipe_nutrition import RecipeNutritionTable
+from services.rate_limiter import RateLimited
+from config import settings
+from utils.helpers import dumps_bytes
 from typing import List, Optional
+from pathlib import Path
+import math
 from pydantic import BaseModel
 
 router = APIRouter()
 edamam_service = EdamamService()
 openai_service = OpenAIService()
+recipe_nutrition = RecipeNutritionTable(Path(settings.RECIPE_NUTRITION_TABLE))
 
 class MealPlanRequest(BaseModel):
     numberOfDays: int
@@ -15,18 +23,87 @@ class MealPlanRequest(BaseModel):
     cuisinePreferences: List[str]
     includeCheatMeal: bool
 
+class BatchNutritionRequest(BaseModel):
+    ingredients: List[str]
+
+def _too_many_requests(error: RateLimited) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(error),
+                         headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))})
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
 @router.post("/meal-plan")
-async def generate_meal_plan(request: MealPlanRequest):
+async def generate_meal_plan(request: MealPlanRequest, if_none_match: Optional[str] = Header(None)):
+    try:
+        payload = await openai_service.generate_meal_plan_payload(request.dict())
+    except RateLimited as e:
+        raise _too_many_requests(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Cached plans are already JSON bytes; send them without re-encoding
+    headers = {"ETag": payload.etag}
+    if _etag_matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+@router.post("/meal-plan/stream")
+async def stream_meal_plan(request: MealPlanRequest, accept: Optional[str] = Header(None)):
+    # Server-sent events when the client asks for them, NDJSON otherwise
+    use_sse = accept is not None and "text/event-stream" in accept
+
+    async def events():
+        async for event in openai_service.stream_meal_plan(request.dict()):
+            data = dumps_bytes(event["data"])
+            if use_sse:
+                yield b"event: " + event["event"].encode() + b"\ndata: " + data + b"\n\n"
+            else:
+                yield dumps_bytes(event) + b"\n"
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@router.get("/meal-plan/generation-stats")
+async def meal_plan_generation_stats():
+    return openai_service.coordinator.get_stats()
+
+@router.post("/nutrition/batch")
+async def analyze_food_batch(request: BatchNutritionRequest):
+    if not request.ingredients:
+        raise HTTPException(status_code=400, detail="No ingredients provided")
+    if len(request.ingredients) > settings.EDAMAM_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many ingredients: at most {settings.EDAMAM_BATCH_MAX_ITEMS} per batch"
+        )
     try:
-        meal_plan = await openai_service.generate_meal_plan(request.dict())
-        return meal_plan
+        return await edamam_service.get_batch_nutrition(request.ingredients)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/nutrition/cache-stats")
+async def nutrition_cache_stats():
+    return edamam_service.cache.get_stats()
+
+@router.get("/recipes/nutrition/{dish_name}")
+async def recipe_nutrition_lookup(dish_name: str):
+    if not recipe_nutrition.loaded:
+        raise HTTPException(status_code=503, detail="Recipe nutrition table not loaded")
+    result = recipe_nutrition.get(dish_name)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No nutrition data for recipe: {dish_name}")
+    return result
+
 @router.get("/{food_item}")
 async def analyze_food(food_item: str):
     try:
         result = await edamam_service.get_nutrition_data(food_item)
         return result
+    except RateLimited as e:
+        raise _too_many_requests(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
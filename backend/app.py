@@ -1,8 +1,41 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import time
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from api.routes import router
+from api.routes import router, edamam_service, openai_service, recipe_nutrition
+from config import settings
+from services.metrics import monitor_event_loop, registry, server_timing_header, start_request_timings
 
-app = FastAPI(title="FoodScores API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled Edamam client per app lifespan
+    await edamam_service.start()
+    await openai_service.request_logger.start()
+    if recipe_nutrition.open():
+        print(f"Loaded nutrition for {len(recipe_nutrition)} recipes from {recipe_nutrition.path}")
+    background_tasks = []
+    if settings.EVENT_LOOP_LAG_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(monitor_event_loop(settings.EVENT_LOOP_LAG_INTERVAL_SECONDS)))
+    if settings.PLAN_CACHE_VALIDATION_SWEEP:
+        background_tasks.append(asyncio.create_task(openai_service.plan_cache.sweep()))
+    if settings.DISH_SOLVER_ENABLED:
+        background_tasks.append(asyncio.create_task(
+            openai_service.dish_library.build_from_cache(openai_service.plan_cache)
+        ))
+    if settings.PREWARM_ENABLED:
+        background_tasks.append(asyncio.create_task(
+            openai_service.cache_warmer.run_forever(settings.PREWARM_INTERVAL_SECONDS)
+        ))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await openai_service.request_logger.stop()
+    await openai_service.llm.close()
+    await edamam_service.close()
+    recipe_nutrition.close()
+
+app = FastAPI(title="FoodScores API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -13,9 +46,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.SERVER_TIMING_ENABLED:
+    @app.middleware("http")
+    async def add_server_timing(request: Request, call_next):
+        # Streamed responses only report the stages finished before the first byte
+        started = time.perf_counter()
+        timings = start_request_timings()
+        response = await call_next(request)
+        timings["total"] = time.perf_counter() - started
+        response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+
 # Include the router
 app.include_router(router, prefix="/api")
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to FoodScores API"}
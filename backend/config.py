@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -7,6 +8,94 @@ class Settings(BaseSettings):
     EDAMAM_APP_ID: str
     EDAMAM_APP_KEY: str
     OPENAI_API_KEY: str
+
+    # Edamam HTTP client
+    EDAMAM_BASE_URL: str = "https://api.edamam.com/api/nutrition-data"
+    EDAMAM_TIMEOUT_SECONDS: float = 10.0
+    EDAMAM_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    EDAMAM_MAX_CONNECTIONS: int = 20
+    EDAMAM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    EDAMAM_MAX_RETRIES: int = 3
+    EDAMAM_RETRY_BACKOFF_SECONDS: float = 0.5
+    EDAMAM_BATCH_CONCURRENCY: int = 5
+    EDAMAM_BATCH_MAX_ITEMS: int = 100
+
+    # Ingredient-level nutrition cache
+    NUTRITION_CACHE_DIR: str = "cache/nutrition"
+    NUTRITION_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    NUTRITION_CACHE_MAX_MEMORY_ENTRIES: int = 5000
+
+    # Per-recipe nutrition table built by utils.ingest_recipes, memory-mapped at startup
+    RECIPE_NUTRITION_TABLE: str = "cache/recipe_nutrition.bin"
+
+    # Meal-plan cache
+    PLAN_CACHE_BACKEND: str = "json"  # "json" (one file per variation) or "sqlite" (single WAL file)
+    PLAN_CACHE_SQLITE_PATH: str = "cache/plans.sqlite3"
+    PLAN_CACHE_MAX_ENTRIES: int = 256
+    PLAN_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PLAN_CACHE_VALIDATION_SWEEP: bool = False  # Validate unchecked entries in the background after startup
+
+    # OpenAI client (async, with its own connection pool)
+    OPENAI_MODEL: str = "gpt-4"
+    OPENAI_BASE_URL: Optional[str] = None  # Default OpenAI endpoint; point at a stub server for benchmarks
+    OPENAI_TIMEOUT_SECONDS: float = 120.0
+    OPENAI_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OPENAI_MAX_CONNECTIONS: int = 50
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_MAX_CONCURRENT_CALLS: int = 16  # Chat completions in flight per worker, across all plans
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_HEDGE_ENABLED: bool = False
+    OPENAI_HEDGE_PERCENTILE: float = 0.95  # Start a second attempt once a call is slower than this
+    OPENAI_HEDGE_MIN_SAMPLES: int = 20  # Recent calls needed before hedging starts
+    OPENAI_HEDGE_MIN_DELAY_SECONDS: float = 5.0
+
+    # Client-side rate limits, shared by all workers through files in RATE_LIMIT_STATE_DIR
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STATE_DIR: str = "cache/ratelimit"
+    RATE_LIMIT_MAX_WAIT_SECONDS: float = 10.0  # Longer expected waits are rejected with 429 and Retry-After
+    OPENAI_RATE_LIMIT_PER_MINUTE: float = 500
+    OPENAI_RATE_LIMIT_BURST: int = 20
+    EDAMAM_RATE_LIMIT_PER_MINUTE: float = 200
+    EDAMAM_RATE_LIMIT_BURST: int = 10
+
+    # Meal-plan generation
+    OPENAI_MAX_CONCURRENT_GENERATIONS: int = 4
+    GENERATION_LOCK_MODE: str = "local"  # "local" (per worker) or "file" (across workers)
+    GENERATION_LOCK_DIR: str = "cache/locks"
+    PLAN_CHUNK_DAYS: int = 1  # Days per LLM request; 0 asks for the whole plan in one request
+    PLAN_MAX_PARALLEL_CHUNKS: int = 7
+    PLAN_MACRO_TOLERANCE: float = 0.4  # Allowed relative gap between 4/4/9 kcal from macros and listed calories
+
+    # Derive plans locally by rescaling a cached plan with a nearby calorie target
+    RESCALE_ENABLED: bool = True
+    RESCALE_MAX_RATIO: float = 0.15  # Largest relative calorie difference that may be rescaled
+
+    # Compose plans from the library of individual cached dishes
+    DISH_SOLVER_ENABLED: bool = True
+    DISH_SOLVER_MIN_DISHES: int = 30
+    DISH_SOLVER_MAX_PORTION_SCALE: float = 0.15  # Largest portion change used to hit the calorie target
+
+    # Instrumentation
+    METRICS_ENABLED: bool = True  # Prometheus text format on /metrics
+    SERVER_TIMING_ENABLED: bool = False  # Per-request stage timings in a Server-Timing header
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.5  # How often event-loop lag is sampled; 0 turns it off
+
+    # Request log (logs/request_logs.jsonl), written in batches by a background task
+    REQUEST_LOG_BATCH_SIZE: int = 100
+    REQUEST_LOG_FLUSH_SECONDS: float = 1.0
+    REQUEST_LOG_MAX_BYTES: int = 50 * 1024 * 1024
+    REQUEST_LOG_ROTATE_DAILY: bool = True
+    REQUEST_LOG_BACKUP_COUNT: int = 14  # Rotated, gzip-compressed files kept
+
+    # Cache pre-warming from the request log (runs in the app lifespan when enabled)
+    PREWARM_ENABLED: bool = False
+    PREWARM_INTERVAL_SECONDS: float = 3600
+    PREWARM_OFF_PEAK_HOURS: str = "1-6"  # Local hours [start, end) passes may run in; empty for any time
+    PREWARM_MAX_KEYS: int = 50
+    PREWARM_TOKEN_BUDGET: int = 200_000  # OpenAI tokens per pass
+    PREWARM_CONCURRENCY: int = 2  # Generation slots a pass may hold at once
+    PREWARM_HALF_LIFE_HOURS: float = 72.0  # Weight of a logged request halves every this many hours
+    PREWARM_LOG_BYTES: int = 20 * 1024 * 1024  # Tail of the request log scanned per pass
     
     class Config:
         env_file = ".env"
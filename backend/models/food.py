@@ -0,0 +1,136 @@
+from typing import Annotated, Any, Dict, List, Optional, Union
+import re
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError
+
+_GRAMS_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*g?\s*$")
+
+# Energy per gram of each macro, used to cross-check meal calories
+MACRO_KCAL_PER_GRAM = {"protein": 4, "carbs": 4, "fat": 9}
+
+def parse_grams(value) -> Optional[float]:
+    """Parse a macro such as "20g" (or a bare number) into grams"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        # Fast path for whole grams ("20g", "20 g", "20"); anything else goes through the regex
+        text = value.strip()
+        if text.endswith("g"):
+            text = text[:-1].rstrip()
+        if text.isascii() and text.isdigit():
+            return float(text)
+        match = _GRAMS_RE.match(value)
+        if match:
+            return float(match.group(1))
+    return None
+
+def format_grams(grams: float) -> str:
+    return f"{round(grams)}g"
+
+def _to_grams(value) -> float:
+    grams = parse_grams(value)
+    if grams is None:
+        raise ValueError(f"not a gram amount: {value!r}")
+    return grams
+
+# "20g" or 20 -> 20.0, parsed once while validating
+Grams = Annotated[float, BeforeValidator(_to_grams)]
+
+class Nutrition(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    protein: Grams
+    carbs: Grams
+    fat: Grams
+
+class Meal(BaseModel):
+    # Older plans also carry ingredients/recipe_steps; derived ones carry portion_scale
+    model_config = ConfigDict(extra="allow")
+
+    type: str
+    name: str
+    cuisine: str
+    calories: float = Field(gt=0)
+    nutrition: Nutrition
+
+class DayPlan(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    day: int
+    meals: List[Meal] = Field(min_length=1)
+    total_calories: float
+
+class MealPlan(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    meal_plan: List[DayPlan] = Field(min_length=1)
+    generation_time: float = 0
+    derived: Optional[Dict[str, Any]] = None
+
+# Built once; validation itself runs in pydantic-core
+DAY_PLANS = TypeAdapter(List[DayPlan])
+
+def _consistency_flags(days: List[DayPlan], daily_calories: Optional[int], calorie_tolerance: float,
+                       macro_tolerance: Optional[float]) -> List[tuple]:
+    """Cross-field checks over every day, as (day index, problem) pairs.
+
+    One pass per day over the already-parsed floats: the meal calorie sum,
+    the day's target, and each meal's calories against its macros.
+    """
+    protein_kcal, carbs_kcal, fat_kcal = (MACRO_KCAL_PER_GRAM[macro] for macro in ("protein", "carbs", "fat"))
+    flags = []
+    for index, day in enumerate(days):
+        day_sum = 0.0
+        for meal in day.meals:
+            calories = meal.calories
+            day_sum += calories
+            if macro_tolerance is not None:
+                nutrition = meal.nutrition
+                from_macros = nutrition.protein * protein_kcal + nutrition.carbs * carbs_kcal + nutrition.fat * fat_kcal
+                if abs(from_macros - calories) > macro_tolerance * calories:
+                    flags.append((index, f"Macros of a meal in day {day.day} give {from_macros:.0f} kcal "
+                                         f"for {calories:g} listed"))
+        if abs(day_sum - day.total_calories) > calorie_tolerance:
+            flags.append((index, f"Meal calories in day {day.day} add up to {day_sum:g}, not {day.total_calories:g}"))
+        if daily_calories is not None and abs(day.total_calories - daily_calories) > calorie_tolerance:
+            flags.append((index, f"Calories out of range in day {day.day}: {day.total_calories:g}"))
+    return flags
+
+def _format_validation_error(error: Dict[str, Any]) -> str:
+    location = ".".join(str(part) for part in error["loc"])
+    return f"Invalid plan at {location}: {error['msg']}"
+
+def plan_errors(plan: Union[bytes, str, Dict[str, Any]], daily_calories: Optional[int] = None,
+                number_of_days: Optional[int] = None, calorie_tolerance: float = 50,
+                macro_tolerance: Optional[float] = None) -> List[str]:
+    """Validate a whole plan (raw JSON or dict); returns a list of problems, empty when valid"""
+    try:
+        if isinstance(plan, (bytes, str)):
+            model = MealPlan.model_validate_json(plan)
+        else:
+            model = MealPlan.model_validate(plan)
+    except ValidationError as e:
+        return [_format_validation_error(e.errors()[0])]
+    if number_of_days is not None and len(model.meal_plan) != number_of_days:
+        return [f"Wrong number of days: got {len(model.meal_plan)}, expected {number_of_days}"]
+    flags = _consistency_flags(model.meal_plan, daily_calories, calorie_tolerance, macro_tolerance)
+    return [message for _, message in flags]
+
+def day_errors(days: List[Any], daily_calories: Optional[int] = None, calorie_tolerance: float = 50,
+               macro_tolerance: Optional[float] = None) -> List[List[str]]:
+    """Validate a batch of generated days; returns the problems found for each day"""
+    results: List[List[str]] = [[] for _ in days]
+    try:
+        models = DAY_PLANS.validate_python(days)
+        positions = list(range(len(days)))
+    except ValidationError as e:
+        for error in e.errors():
+            if error["loc"] and isinstance(error["loc"][0], int):
+                results[error["loc"][0]].append(_format_validation_error(error))
+            else:
+                return [[_format_validation_error(error)] for _ in days]
+        positions = [index for index, problems in enumerate(results) if not problems]
+        models = DAY_PLANS.validate_python([days[index] for index in positions])
+
+    for index, message in _consistency_flags(models, daily_calories, calorie_tolerance, macro_tolerance):
+        results[positions[index]].append(message)
+    return results
@@ -0,0 +1,297 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Optional
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process safety only
+    fcntl = None
+
+_VARIATION_RE = re.compile(r"^(?P<key>[0-9a-f]+)_v(?P<variation>\d+)$")
+
+STATUS_UNCHECKED = "unchecked"
+STATUS_VALID = "valid"
+
+def new_meta(schema_version=None, status=STATUS_UNCHECKED, params=None, summary=None) -> Dict[str, Any]:
+    return {"schema_version": schema_version, "status": status, "params": params, "summary": summary}
+
+def plan_summary(plan: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """Small description of a plan kept in metadata so listings never read plan bodies"""
+    days = plan.get("meal_plan") or []
+    return {
+        "days": len(days),
+        "meals": sum(len(day.get("meals") or []) for day in days),
+        "bytes": size,
+        "created_at": time.time()
+    }
+
+def pick_slot(used_slots, max_variations: int) -> int:
+    """Lowest free variation slot, or a random used one when the key is full"""
+    used_slots = set(used_slots)
+    if len(used_slots) >= max_variations:
+        return random.choice(sorted(used_slots))
+    return next(i for i in range(len(used_slots) + 1) if i not in used_slots)
+
+class CacheBackend:
+    """Storage for meal-plan variations; bodies are UTF-8 JSON bytes.
+
+    Metadata per variation is {"schema_version", "status", "params", "summary"}.
+    """
+
+    def list_entries(self) -> Dict[tuple, Dict[str, Any]]:
+        """Metadata for every (cache_key, variation) without reading plan bodies"""
+        raise NotImplementedError
+
+    def list_variations(self, cache_key: str) -> Dict[int, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def read(self, cache_key: str, variation: int) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def write(self, cache_key: str, body: bytes, meta: Dict[str, Any], max_variations: int) -> int:
+        """Store body in a free slot (or replace one when full) and return the slot"""
+        raise NotImplementedError
+
+    def put(self, cache_key: str, variation: int, body: bytes, meta: Dict[str, Any]):
+        """Store body in a specific slot (used by migrations)"""
+        raise NotImplementedError
+
+    def delete(self, cache_key: str, variation: int):
+        raise NotImplementedError
+
+    def set_meta(self, cache_key: str, variation: int, meta: Dict[str, Any]):
+        raise NotImplementedError
+
+class JsonFileBackend(CacheBackend):
+    """One JSON file per variation (cache/<key>_v<n>.json) plus a metadata sidecar (cache/<key>_v<n>.meta).
+
+    Writes go through a temp file and os.replace, and slot selection happens
+    under an exclusive flock so several workers can share the directory.
+    Nothing is shared between entries, so a miss or a write only lists or
+    touches the files of its own key. A manifest.json from older versions
+    is split into sidecars the first time the entries are listed.
+    """
+
+    def __init__(self, cache_dir: Path, max_variations: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # With a known slot count, a key's variations are found by probing its slots, not listing the directory
+        self.max_variations = max_variations
+        self.manifest_path = cache_dir / "manifest.json"
+        self.lock_path = cache_dir / ".manifest.lock"
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _path_for(self, cache_key: str, variation: int) -> Path:
+        return self.cache_dir / f"{cache_key}_v{variation}.json"
+
+    def _meta_path_for(self, cache_key: str, variation: int) -> Path:
+        return self.cache_dir / f"{cache_key}_v{variation}.meta"
+
+    def _atomic_write(self, path: Path, data: bytes):
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _variations_on_disk(self, cache_key: str, max_variations: Optional[int] = None):
+        max_variations = max_variations or self.max_variations
+        if max_variations:
+            return [v for v in range(max_variations) if self._path_for(cache_key, v).exists()]
+        variations = []
+        for path in self.cache_dir.glob(f"{cache_key}_v*.json"):
+            match = _VARIATION_RE.match(path.stem)
+            if match and match.group("key") == cache_key:
+                variations.append(int(match.group("variation")))
+        return variations
+
+    def _read_meta(self, cache_key: str, variation: int) -> Dict[str, Any]:
+        # A missing or unreadable sidecar leaves the entry unchecked; it is validated when first read
+        try:
+            with open(self._meta_path_for(cache_key, variation), 'rb') as f:
+                meta = json.loads(f.read())
+            return meta if isinstance(meta, dict) else new_meta()
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+            return new_meta()
+
+    def _write_meta(self, cache_key: str, variation: int, meta: Dict[str, Any]):
+        self._atomic_write(self._meta_path_for(cache_key, variation), json.dumps(meta, separators=(",", ":")).encode())
+
+    def _migrate_manifest(self):
+        """Split a manifest.json written by older versions into per-entry sidecars"""
+        with self._locked():
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    entries = json.load(f)["entries"]
+            except FileNotFoundError:
+                return
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                print(f"Ignoring corrupted cache manifest: {str(e)}")
+                entries = {}
+            for stem, meta in entries.items():
+                match = _VARIATION_RE.match(stem)
+                if not match or not isinstance(meta, dict):
+                    continue
+                cache_key, variation = match.group("key"), int(match.group("variation"))
+                if self._path_for(cache_key, variation).exists() and not self._meta_path_for(cache_key, variation).exists():
+                    self._write_meta(cache_key, variation, meta)
+            self.manifest_path.unlink()
+
+    def list_entries(self) -> Dict[tuple, Dict[str, Any]]:
+        if self.manifest_path.exists():
+            self._migrate_manifest()
+        result = {}
+        for cache_file in self.cache_dir.glob("*_v*.json"):
+            match = _VARIATION_RE.match(cache_file.stem)
+            if match:
+                cache_key, variation = match.group("key"), int(match.group("variation"))
+                result[(cache_key, variation)] = self._read_meta(cache_key, variation)
+        return result
+
+    def list_variations(self, cache_key: str) -> Dict[int, Dict[str, Any]]:
+        return {
+            variation: self._read_meta(cache_key, variation)
+            for variation in self._variations_on_disk(cache_key)
+        }
+
+    def read(self, cache_key: str, variation: int) -> Optional[bytes]:
+        try:
+            return self._path_for(cache_key, variation).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write(self, cache_key: str, body: bytes, meta: Dict[str, Any], max_variations: int) -> int:
+        with self._locked():
+            variation = pick_slot(self._variations_on_disk(cache_key, max_variations), max_variations)
+            self._atomic_write(self._path_for(cache_key, variation), body)
+            self._write_meta(cache_key, variation, meta)
+        return variation
+
+    def put(self, cache_key: str, variation: int, body: bytes, meta: Dict[str, Any]):
+        self._atomic_write(self._path_for(cache_key, variation), body)
+        self._write_meta(cache_key, variation, meta)
+
+    def delete(self, cache_key: str, variation: int):
+        self._path_for(cache_key, variation).unlink(missing_ok=True)
+        self._meta_path_for(cache_key, variation).unlink(missing_ok=True)
+
+    def set_meta(self, cache_key: str, variation: int, meta: Dict[str, Any]):
+        self._write_meta(cache_key, variation, meta)
+
+class SQLiteBackend(CacheBackend):
+    """All variations in one SQLite file in WAL mode, with compact JSON bodies.
+
+    Slot selection and the write happen in one BEGIN IMMEDIATE transaction,
+    so concurrent workers never collide on a variation.
+    """
+
+    def __init__(self, db_path: Path, busy_timeout_seconds: float = 5.0):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), timeout=busy_timeout_seconds,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                cache_key TEXT NOT NULL,
+                variation INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                schema_version INTEGER,
+                status TEXT NOT NULL,
+                params TEXT,
+                created_at REAL NOT NULL,
+                summary TEXT,
+                PRIMARY KEY (cache_key, variation)
+            ) WITHOUT ROWID
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(plans)")}
+        if "summary" not in columns:
+            self.conn.execute("ALTER TABLE plans ADD COLUMN summary TEXT")
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _meta_from_row(self, schema_version, status, params, summary) -> Dict[str, Any]:
+        return new_meta(schema_version, status, json.loads(params) if params else None,
+                        json.loads(summary) if summary else None)
+
+    def _json_column(self, value) -> Optional[str]:
+        return json.dumps(value, separators=(",", ":")) if value is not None else None
+
+    def list_entries(self) -> Dict[tuple, Dict[str, Any]]:
+        rows = self.conn.execute("SELECT cache_key, variation, schema_version, status, params, summary FROM plans")
+        return {(key, variation): self._meta_from_row(*meta) for key, variation, *meta in rows}
+
+    def list_variations(self, cache_key: str) -> Dict[int, Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT variation, schema_version, status, params, summary FROM plans WHERE cache_key = ?", (cache_key,)
+        )
+        return {variation: self._meta_from_row(*meta) for variation, *meta in rows}
+
+    def read(self, cache_key: str, variation: int) -> Optional[bytes]:
+        row = self.conn.execute(
+            "SELECT body FROM plans WHERE cache_key = ? AND variation = ?", (cache_key, variation)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def _upsert(self, cache_key, variation, body, meta):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO plans (cache_key, variation, body, schema_version, status, params, created_at, summary)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (cache_key, variation, body, meta.get("schema_version"), meta.get("status", STATUS_UNCHECKED),
+             self._json_column(meta.get("params")), time.time(), self._json_column(meta.get("summary")))
+        )
+
+    def write(self, cache_key: str, body: bytes, meta: Dict[str, Any], max_variations: int) -> int:
+        with self._transaction():
+            used = [row[0] for row in self.conn.execute("SELECT variation FROM plans WHERE cache_key = ?", (cache_key,))]
+            variation = pick_slot(used, max_variations)
+            self._upsert(cache_key, variation, body, meta)
+        return variation
+
+    def put(self, cache_key: str, variation: int, body: bytes, meta: Dict[str, Any]):
+        with self._transaction():
+            self._upsert(cache_key, variation, body, meta)
+
+    def delete(self, cache_key: str, variation: int):
+        self.conn.execute("DELETE FROM plans WHERE cache_key = ? AND variation = ?", (cache_key, variation))
+
+    def set_meta(self, cache_key: str, variation: int, meta: Dict[str, Any]):
+        self.conn.execute(
+            "UPDATE plans SET schema_version = ?, status = ?, params = ?, summary = ? WHERE cache_key = ? AND variation = ?",
+            (meta.get("schema_version"), meta.get("status", STATUS_UNCHECKED),
+             self._json_column(meta.get("params")), self._json_column(meta.get("summary")),
+             cache_key, variation)
+        )
+
+def create_backend(kind: str, cache_dir: Path, sqlite_path: Optional[Path] = None,
+                   max_variations: Optional[int] = None) -> CacheBackend:
+    if kind == "json":
+        return JsonFileBackend(cache_dir, max_variations)
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path or cache_dir / "plans.sqlite3")
+    raise ValueError(f"Unknown plan cache backend: {kind}")
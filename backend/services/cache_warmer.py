@@ -0,0 +1,206 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import gzip
+import json
+import math
+from services.rate_limiter import RateLimited
+
+# Log entry types that reflect user demand (prewarm fills do not)
+DEMAND_TYPES = {"cache_hit", "derived", "composed", "api_call", "error", "rate_limited"}
+
+def parse_hours(window: str) -> Tuple[int, int]:
+    """"1-6" -> (1, 6); the window may wrap past midnight ("22-5")"""
+    start, end = window.split("-")
+    return int(start) % 24, int(end) % 24
+
+def in_window(window: Optional[str], now: Optional[datetime] = None) -> bool:
+    if not window:
+        return True
+    start, end = parse_hours(window)
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+class CacheWarmer:
+    """Fills the plan cache ahead of demand for frequently and recently requested params.
+
+    Candidates are scored from the tail of the request log, each entry
+    counting exp(-age / half_life), so a key requested often last week
+    and one requested a few times today both rank. Params come from the
+    cache metadata or from the log entries of misses. Each candidate is
+    topped up to max_cache_per_params variations, a few at a time, until
+    the token budget for the pass is spent or the off-peak window closes.
+    """
+
+    def __init__(self, openai_service, log_file: Path, max_keys: int = 50, token_budget: int = 200_000,
+                 concurrency: int = 2, off_peak_hours: Optional[str] = "1-6", half_life_hours: float = 72.0,
+                 max_log_bytes: int = 20 * 1024 * 1024):
+        self.service = openai_service
+        self.log_file = log_file
+        self.max_keys = max_keys
+        self.token_budget = token_budget
+        self.concurrency = concurrency
+        self.off_peak_hours = off_peak_hours
+        self.half_life_hours = half_life_hours
+        self.max_log_bytes = max_log_bytes
+        self.stats = {"passes": 0, "generated": 0, "failed": 0, "tokens": 0, "last_pass": None}
+
+    def _log_files(self) -> List[Path]:
+        """The live request log, then its rotated (possibly gzipped) copies, newest first"""
+        stem = self.log_file.stem
+        # Rotated names carry a sortable timestamp: request_logs-20240101-013000-000000-<pid>.jsonl.gz
+        rotated = sorted(self.log_file.parent.glob(f"{stem}-*{self.log_file.suffix}*"), reverse=True)
+        return [self.log_file] + rotated
+
+    @staticmethod
+    def _read_tail(path: Path, limit: int) -> Tuple[bytes, bool]:
+        """The last limit bytes of a log file (decompressed), and whether anything was cut off"""
+        if path.suffix == ".gz":
+            tail = b""
+            total = 0
+            with gzip.open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    total += len(block)
+                    tail = (tail + block)[-limit:]
+            return tail, total > limit
+        with open(path, 'rb') as f:
+            size = f.seek(0, 2)
+            f.seek(max(0, size - limit))
+            return f.read(), size > limit
+
+    def _tail_entries(self):
+        """Parsed entries from the last max_log_bytes of the request log, across rotations"""
+        chunks = []
+        remaining = self.max_log_bytes
+        for path in self._log_files():
+            if remaining <= 0:
+                break
+            try:
+                data, truncated = self._read_tail(path, remaining)
+            except FileNotFoundError:
+                continue  # Not written yet, or rotated away while we listed
+            except (OSError, EOFError) as e:
+                print(f"Skipping unreadable request log {path}: {str(e)}")
+                continue
+            remaining -= len(data)
+            if truncated:
+                data = data[data.find(b"\n") + 1:] if b"\n" in data else b""  # Skip the partial first line
+            chunks.append(data)
+
+        # Oldest first, so later entries win where they overwrite earlier ones
+        for data in reversed(chunks):
+            for line in data.splitlines():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def demand(self, now: Optional[datetime] = None) -> Tuple[Dict[str, float], Dict[str, Dict[str, Any]]]:
+        """Decayed request scores per cache key and the params last logged for each; reads only the log"""
+        now = now or datetime.now()
+        decay = math.log(2) / (self.half_life_hours * 3600)
+        scores: Dict[str, float] = {}
+        params: Dict[str, Dict[str, Any]] = {}
+        for entry in self._tail_entries():
+            if entry.get("type") not in DEMAND_TYPES or not entry.get("cache_key"):
+                continue
+            try:
+                age = (now - datetime.fromisoformat(entry["timestamp"])).total_seconds()
+            except (KeyError, TypeError, ValueError):
+                continue
+            cache_key = entry["cache_key"]
+            scores[cache_key] = scores.get(cache_key, 0.0) + math.exp(-decay * max(0.0, age))
+            if entry.get("params"):
+                params[cache_key] = entry["params"]
+        return scores, params
+
+    def candidates(self, index: Dict[str, Dict[int, Dict[str, Any]]], scores: Dict[str, float],
+                   params: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keys worth warming, best first: {"cache_key", "params", "score", "missing"}"""
+        result = []
+        for cache_key, score in sorted(scores.items(), key=lambda item: -item[1]):
+            slots = index.get(cache_key, {})
+            missing = self.service.max_cache_per_params - len(slots)
+            if missing <= 0:
+                continue
+            key_params = params.get(cache_key) or next(
+                (meta["params"] for meta in slots.values() if meta.get("params")), None
+            )
+            if key_params is None:
+                continue  # Logged before params were recorded; nothing to regenerate from
+            if self.service._generate_cache_key(key_params) != cache_key:
+                continue  # Cache version changed since; the old key is never requested again
+            result.append({"cache_key": cache_key, "params": key_params, "score": score, "missing": missing})
+            if len(result) >= self.max_keys:
+                break
+        return result
+
+    async def run_once(self, ignore_window: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+        """One warming pass; returns what was planned and generated"""
+        if not ignore_window and not in_window(self.off_peak_hours):
+            return {"skipped": "outside off-peak window"}
+        # The log is read in a worker thread; the cache index is only touched here on the loop
+        scores, params = await asyncio.to_thread(self.demand)
+        plan_cache = self.service.plan_cache
+        await plan_cache.load_index()
+        candidates = self.candidates(dict(plan_cache.index), scores, params)
+        report = {"candidates": len(candidates), "planned": sum(c["missing"] for c in candidates),
+                  "generated": 0, "failed": 0, "tokens": 0}
+        if dry_run:
+            report["keys"] = [(c["cache_key"], round(c["score"], 3), c["missing"]) for c in candidates]
+            return report
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        stop = asyncio.Event()
+
+        async def fill(cache_key, plan_params, missing):
+            # Variations of one key are generated one after another; concurrent runs would be coalesced
+            async with semaphore:
+                for _ in range(missing):
+                    if stop.is_set():
+                        return
+                    if report["tokens"] >= self.token_budget or (not ignore_window and not in_window(self.off_peak_hours)):
+                        stop.set()
+                        return
+                    run_stats = self.service._new_run_stats()
+                    try:
+                        # Shares the in-flight generation with any user request for the same key
+                        await self.service.coordinator.run(
+                            cache_key,
+                            lambda: self.service._generate_and_cache(
+                                plan_params, cache_key, self.service._generate_params_hash(plan_params),
+                                run_stats=run_stats, log_type="prewarm"
+                            )
+                        )
+                        report["generated"] += 1
+                    except RateLimited:
+                        stop.set()  # Leave the budget to user traffic
+                        report["failed"] += 1
+                    except Exception as e:
+                        print(f"Pre-warm error for {cache_key}: {str(e)}")
+                        report["failed"] += 1
+                        return
+                    finally:
+                        report["tokens"] += run_stats["tokens"]["total"]
+
+        await asyncio.gather(*(fill(c["cache_key"], c["params"], c["missing"]) for c in candidates))
+        self.stats["passes"] += 1
+        self.stats["generated"] += report["generated"]
+        self.stats["failed"] += report["failed"]
+        self.stats["tokens"] += report["tokens"]
+        self.stats["last_pass"] = datetime.now().isoformat()
+        return report
+
+    async def run_forever(self, interval_seconds: float):
+        """Background loop for the app lifespan: one pass per interval inside the off-peak window"""
+        while True:
+            try:
+                report = await self.run_once()
+                if "skipped" not in report:
+                    print(f"Cache pre-warm pass: {report}")
+            except Exception as e:
+                print(f"Cache pre-warm error: {str(e)}")
+            await asyncio.sleep(interval_seconds)
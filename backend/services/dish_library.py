@@ -0,0 +1,269 @@
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import random
+from models.food import parse_grams
+from services.plan_rescaler import rescale_day
+from utils.helpers import dumps_bytes
+
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack"]
+MAX_HEALTH_CONDITIONS = 32  # One bit each in the health mask column
+
+def meal_type_code(meal_type: str) -> int:
+    meal_type = (meal_type or "").lower()
+    for code, name in enumerate(MEAL_TYPES):
+        if name in meal_type:
+            return code
+    return MEAL_TYPES.index("snack")
+
+def normalize_label(value: str) -> str:
+    return " ".join(str(value).split()).lower()
+
+def _read_plans(backend, entries) -> List[tuple]:
+    """(plan, params) for each readable (cache_key, variation, params) entry; runs in a worker thread"""
+    plans = []
+    for cache_key, variation, params in entries:
+        raw = backend.read(cache_key, variation)
+        if raw is None:
+            continue
+        try:
+            plan = json.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue  # Left for the plan cache to discard when it is next read
+        if isinstance(plan, dict):
+            plans.append((plan, params))
+    return plans
+
+class DishLibrary:
+    """Deduplicated dishes from cached and generated plans, stored column by column.
+
+    Numeric columns are compact typed arrays (calories and macros in grams
+    as float32, cuisine and meal type as byte codes, health conditions as
+    a 32-bit mask of the conditions the source plan was generated for).
+    The source meals are kept alongside as JSON bytes for building responses.
+    """
+
+    def __init__(self):
+        self.calories = array('f')
+        self.protein = array('f')
+        self.carbs = array('f')
+        self.fat = array('f')
+        self.cuisine = array('B')
+        self.meal_type = array('B')
+        self.health_mask = array('I')
+        # Serialized dishes: bytes are not tracked by the garbage collector, however many there are
+        self.meals: List[bytes] = []
+        self.cuisine_codes: Dict[str, int] = {}
+        self.health_bits: Dict[str, int] = {}
+        self._seen = set()  # Dish keys as strings, which (unlike tuples) the garbage collector does not track
+        self._buckets: Optional[Dict[tuple, tuple]] = None
+        self.ready = False
+
+    def __len__(self):
+        return len(self.meals)
+
+    def _cuisine_code(self, cuisine: str) -> Optional[int]:
+        cuisine = normalize_label(cuisine)
+        if cuisine not in self.cuisine_codes:
+            if len(self.cuisine_codes) >= 255:
+                return None
+            self.cuisine_codes[cuisine] = len(self.cuisine_codes)
+        return self.cuisine_codes[cuisine]
+
+    def health_mask_for(self, conditions, create: bool = False) -> Optional[int]:
+        mask = 0
+        for condition in conditions or []:
+            condition = normalize_label(condition)
+            if condition not in self.health_bits:
+                if not create or len(self.health_bits) >= MAX_HEALTH_CONDITIONS:
+                    return None
+                self.health_bits[condition] = len(self.health_bits)
+            mask |= 1 << self.health_bits[condition]
+        return mask
+
+    def add_plan(self, plan: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> int:
+        """Break a plan into dishes; returns how many new dishes were added"""
+        # Dishes from plans with unknown params are only offered to requests without health conditions
+        health_mask = self.health_mask_for((params or {}).get('healthConditions'), create=True)
+        if health_mask is None:
+            return 0
+        added = 0
+        days = plan.get('meal_plan')
+        for day in days if isinstance(days, list) else []:
+            if not isinstance(day, dict) or not isinstance(day.get('meals'), list):
+                continue  # Cached plans are not necessarily validated yet
+            for meal in day['meals']:
+                try:
+                    calories = float(meal['calories'])
+                    macros = [parse_grams(meal.get('nutrition', {}).get(name)) for name in ('protein', 'carbs', 'fat')]
+                    cuisine = self._cuisine_code(meal['cuisine'])
+                    meal_type = meal_type_code(meal.get('type'))
+                    key = f"{normalize_label(meal['name'])}|{cuisine}|{meal_type}|{round(calories)}|{health_mask}"
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if calories <= 0 or cuisine is None or any(value is None for value in macros):
+                    continue
+
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+                self.calories.append(calories)
+                self.protein.append(macros[0])
+                self.carbs.append(macros[1])
+                self.fat.append(macros[2])
+                self.cuisine.append(cuisine)
+                self.meal_type.append(meal_type)
+                self.health_mask.append(health_mask)
+                self.meals.append(dumps_bytes({k: meal[k] for k in ('type', 'name', 'cuisine', 'calories', 'nutrition')}))
+                added += 1
+        if added:
+            self._buckets = None
+        return added
+
+    async def build_from_cache(self, plan_cache, batch_size: int = 25):
+        """Populate the library from every cached plan without stalling the event loop.
+
+        Bodies are read straight from the backend and parsed in a worker
+        thread, batch_size plans at a time: going through plan_cache.load
+        would validate each unchecked plan, write its metadata back and
+        fill the LRU with plans nobody asked for. Only add_plan runs on the
+        loop, and it skips meals it cannot use, so unchecked plans are safe.
+        """
+        index = await plan_cache.load_index()
+        # Snapshot on the loop; requests keep changing the index while we read
+        entries = [(cache_key, variation, meta.get("params"))
+                   for cache_key, slots in list(index.items()) for variation, meta in slots.items()]
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            plans = await asyncio.to_thread(_read_plans, plan_cache.backend, batch)
+            for plan, params in plans:
+                self.add_plan(plan, params)
+                await asyncio.sleep(0)
+        self.ready = True
+        return len(self)
+
+    def buckets(self) -> Dict[tuple, tuple]:
+        # (meal type, cuisine) -> (dish indices sorted by calories, their calories)
+        if self._buckets is None:
+            grouped: Dict[tuple, List[int]] = {}
+            for index in range(len(self.meals)):
+                grouped.setdefault((self.meal_type[index], self.cuisine[index]), []).append(index)
+            self._buckets = {}
+            for bucket, indices in grouped.items():
+                indices.sort(key=lambda i: self.calories[i])
+                self._buckets[bucket] = (indices, [self.calories[i] for i in indices])
+        return self._buckets
+
+class PlanSolver:
+    """Composes N-day plans from the dish library without an LLM call.
+
+    Each day fills breakfast/lunch/dinner (plus snacks for higher targets)
+    with dishes from the requested cuisines and health conditions. The last
+    slot is chosen by binary search for the dish closest to the remaining
+    calories, and portions are then scaled by at most max_portion_scale to
+    hit the target exactly.
+    """
+
+    def __init__(self, library: DishLibrary, max_portion_scale: float, attempts_per_day: int = 200):
+        self.library = library
+        self.max_portion_scale = max_portion_scale
+        self.attempts_per_day = attempts_per_day
+
+    def _slots_for(self, daily_calories: int) -> List[int]:
+        slots = [MEAL_TYPES.index("breakfast"), MEAL_TYPES.index("lunch"), MEAL_TYPES.index("dinner")]
+        snacks = 0 if daily_calories <= 2200 else 1 if daily_calories <= 2800 else 2
+        return slots[:2] + [MEAL_TYPES.index("snack")] * snacks + slots[2:]
+
+    def _pick(self, candidates, used, rng, target=None, tries=8):
+        """Pick an unused dish: at random, or the one closest to target calories"""
+        indices, calories = candidates
+        if target is None:
+            order = [rng.randrange(len(indices)) for _ in range(tries)]
+        else:
+            position = bisect_left(calories, target)
+            window = range(max(0, position - tries // 2), min(len(indices), position + tries // 2))
+            order = sorted(window, key=lambda i: abs(calories[i] - target))
+        for i in order:
+            if indices[i] not in used:
+                return indices[i]
+        # Every candidate tried is already in the plan; allow a repeat
+        return indices[order[0]] if order else None
+
+    def _filter(self, bucket, health_mask):
+        indices, calories = bucket
+        kept = [(i, c) for i, c in zip(indices, calories) if self.library.health_mask[i] & health_mask == health_mask]
+        return ([i for i, _ in kept], [c for _, c in kept])
+
+    def solve(self, plan_params: Dict[str, Any], per_day_cuisines: List[Dict[str, int]],
+              seed: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        library = self.library
+        if plan_params.get('includeCheatMeal'):
+            return None  # Library dishes are not tagged as cheat meals; leave these plans to the LLM
+        required_mask = library.health_mask_for(plan_params.get('healthConditions'), create=False)
+        if required_mask is None:
+            return None  # A requested condition never appears in the library
+        target = int(plan_params['dailyCalories'])
+        rng = random.Random(seed)
+        buckets = library.buckets()
+        cuisine_codes = {}
+        for preference in plan_params['cuisinePreferences']:
+            name = normalize_label(preference.split(':')[0])
+            if name not in library.cuisine_codes:
+                return None  # Every requested cuisine must be served, not replaced by another
+            cuisine_codes[name] = library.cuisine_codes[name]
+        if not cuisine_codes:
+            return None
+
+        candidate_cache = {}
+
+        def candidates(meal_type, cuisine):
+            key = (meal_type, cuisine)
+            if key not in candidate_cache:
+                candidate_cache[key] = self._filter(buckets.get(key, ([], [])), required_mask)
+            return candidate_cache[key]
+
+        used = set()
+        days = []
+        for day_number, day_cuisines in enumerate(per_day_cuisines, start=1):
+            slots = self._slots_for(target)
+            wanted = [normalize_label(c) for c, count in day_cuisines.items() for _ in range(count)]
+            best = None
+            for _ in range(self.attempts_per_day):
+                # Assign the day's cuisine quota to slots, filling extra slots from any preferred cuisine
+                slot_cuisines = rng.sample(wanted, len(wanted))[:len(slots)]
+                slot_cuisines += [rng.choice(list(cuisine_codes)) for _ in range(len(slots) - len(slot_cuisines))]
+                chosen = []
+                for meal_type, cuisine in zip(slots[:-1], slot_cuisines[:-1]):
+                    pool = candidates(meal_type, cuisine_codes[cuisine])
+                    dish = self._pick(pool, used, rng) if pool[0] else None
+                    if dish is None:
+                        break
+                    chosen.append(dish)
+                if len(chosen) != len(slots) - 1:
+                    continue
+                remaining = target - sum(library.calories[i] for i in chosen)
+                pool = candidates(slots[-1], cuisine_codes[slot_cuisines[-1]])
+                last = self._pick(pool, used, rng, target=remaining) if pool[0] else None
+                if last is None:
+                    continue
+                chosen.append(last)
+                total = sum(library.calories[i] for i in chosen)
+                error = abs(total - target) / target
+                if best is None or error < best[0]:
+                    best = (error, chosen)
+                if error <= self.max_portion_scale / 2:
+                    break
+            if best is None or best[0] > self.max_portion_scale:
+                return None
+
+            used.update(best[1])
+            day = {
+                "day": day_number,
+                "meals": [json.loads(library.meals[i]) for i in best[1]],
+                "total_calories": target
+            }
+            days.append(rescale_day(day, target))
+
+        return {"meal_plan": days, "generation_time": 0, "derived": {"method": "dish_library"}}
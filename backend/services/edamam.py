@@ -1,23 +1,177 @@
-from typing import Dict, Any
-import requests
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import asyncio
+import time
+import httpx
 from config import settings
+from services.metrics import EDAMAM_REQUESTS, EDAMAM_RETRIES, observe_stage, stage_timer
+from services.nutrition_cache import NutritionCache
+from services.rate_limiter import AdaptiveRateLimiter
+from utils.helpers import normalize_ingredient
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
 
 class EdamamService:
     def __init__(self):
         self.app_id = settings.EDAMAM_APP_ID
         self.app_key = settings.EDAMAM_APP_KEY
-        self.base_url = "https://api.edamam.com/api/nutrition-data"
+        self.base_url = settings.EDAMAM_BASE_URL
+        self.max_retries = settings.EDAMAM_MAX_RETRIES
+        self.retry_backoff = settings.EDAMAM_RETRY_BACKOFF_SECONDS
+        self.client: Optional[httpx.AsyncClient] = None
+        self.cache = NutritionCache()
+        self.rate_limiter = AdaptiveRateLimiter(
+            "edamam",
+            per_minute=settings.EDAMAM_RATE_LIMIT_PER_MINUTE,
+            burst=settings.EDAMAM_RATE_LIMIT_BURST,
+            max_concurrency=settings.EDAMAM_MAX_CONNECTIONS,
+            state_dir=Path(settings.RATE_LIMIT_STATE_DIR),
+            max_wait=settings.RATE_LIMIT_MAX_WAIT_SECONDS
+        ) if settings.RATE_LIMIT_ENABLED else None
+
+    async def start(self):
+        """Open the pooled HTTP client; called once from the app lifespan"""
+        if self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.EDAMAM_TIMEOUT_SECONDS,
+                connect=settings.EDAMAM_CONNECT_TIMEOUT_SECONDS
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.EDAMAM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.EDAMAM_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+
+    async def close(self):
+        """Close the pooled HTTP client and its keep-alive connections"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _retry_delay(self, attempt, response=None):
+        # Honour Retry-After when Edamam sends one, otherwise back off exponentially
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.retry_backoff * (2 ** attempt)
 
     async def get_nutrition_data(self, food_item: str) -> Dict[Any, Any]:
+        ingredient_key = normalize_ingredient(food_item)
+        with stage_timer("edamam", "cache_lookup"):
+            cached = await self.cache.get(ingredient_key)
+        if cached is not None:
+            EDAMAM_REQUESTS.inc(outcome="cache_hit")
+            return cached
+
+        try:
+            data = await self._fetch_nutrition_data(ingredient_key)
+        except Exception:
+            EDAMAM_REQUESTS.inc(outcome="error")
+            raise
+        EDAMAM_REQUESTS.inc(outcome="fetched")
+        with stage_timer("edamam", "cache_write"):
+            await self.cache.set(ingredient_key, data)
+        return data
+
+    async def _get(self, params) -> httpx.Response:
+        """One Edamam request through the shared rate limiter"""
+        if self.rate_limiter is None:
+            return await self.client.get(self.base_url, params=params)
+        await self.rate_limiter.acquire()
+        response = None
+        try:
+            response = await self.client.get(self.base_url, params=params)
+            return response
+        finally:
+            if response is not None:
+                self.rate_limiter.release(response.status_code, response.headers)
+            else:
+                self.rate_limiter.release()
+
+    async def _fetch_nutrition_data(self, food_item: str) -> Dict[Any, Any]:
+        if self.client is None:
+            await self.start()
+
         params = {
             "app_id": self.app_id,
             "app_key": self.app_key,
             "ingr": food_item
         }
-        
-        response = requests.get(self.base_url, params=params)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
+
+        for attempt in range(self.max_retries + 1):
+            is_last_attempt = attempt == self.max_retries
+            started = time.perf_counter()
+            try:
+                response = await self._get(params)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                observe_stage("edamam", "upstream", time.perf_counter() - started)
+                if is_last_attempt:
+                    raise Exception(f"API request failed: {str(e)}")
+                EDAMAM_RETRIES.inc(reason=type(e).__name__)
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            observe_stage("edamam", "upstream", time.perf_counter() - started)
+
+            if response.status_code == 200:
+                with stage_timer("edamam", "parse"):
+                    return response.json()
+
+            if response.status_code in RETRYABLE_STATUS_CODES and not is_last_attempt:
+                EDAMAM_RETRIES.inc(reason=str(response.status_code))
+                await asyncio.sleep(self._retry_delay(attempt, response))
+                continue
+
             raise Exception(f"API request failed with status code: {response.status_code}")
+
+    async def get_batch_nutrition(self, ingredients: List[str], concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Analyze a list of ingredient lines, looking up each distinct line once"""
+        unique_lines = {}
+        for line in ingredients:
+            normalized = normalize_ingredient(line)
+            if normalized:
+                unique_lines.setdefault(normalized, line)
+
+        semaphore = asyncio.Semaphore(concurrency or settings.EDAMAM_BATCH_CONCURRENCY)
+
+        async def fetch(normalized):
+            async with semaphore:
+                try:
+                    return {"status": "ok", "data": await self.get_nutrition_data(normalized)}
+                except Exception as e:
+                    return {"status": "error", "error": str(e)}
+
+        keys = list(unique_lines)
+        outcomes = await asyncio.gather(*(fetch(key) for key in keys))
+        results = dict(zip(keys, outcomes))
+
+        items = []
+        for line in ingredients:
+            normalized = normalize_ingredient(line)
+            if not normalized:
+                items.append({"ingredient": line, "status": "error", "error": "Empty ingredient line"})
+                continue
+            items.append({"ingredient": line, "normalized": normalized, **results[normalized]})
+
+        return {
+            "items": items,
+            "totals": self._aggregate_totals(item["data"] for item in items if item["status"] == "ok"),
+            "unique_lookups": len(keys),
+            "failed": sum(1 for item in items if item["status"] == "error")
+        }
+
+    def _aggregate_totals(self, results) -> Dict[str, Any]:
+        totals = {"calories": 0, "totalWeight": 0.0, "totalNutrients": {}}
+        for data in results:
+            totals["calories"] += data.get("calories", 0) or 0
+            totals["totalWeight"] += data.get("totalWeight", 0) or 0
+            for code, nutrient in (data.get("totalNutrients") or {}).items():
+                entry = totals["totalNutrients"].setdefault(code, {
+                    "label": nutrient.get("label", code),
+                    "quantity": 0.0,
+                    "unit": nutrient.get("unit", "")
+                })
+                entry["quantity"] += nutrient.get("quantity", 0) or 0
+        return totals
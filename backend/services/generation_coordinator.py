@@ -0,0 +1,108 @@
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import os
+import time
+from services.metrics import observe_stage
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-worker file locks are unavailable
+    fcntl = None
+
+class GenerationCoordinator:
+    """Coalesces identical in-flight generations and caps concurrent LLM calls.
+
+    Within a worker, concurrent callers with the same key share one task.
+    With lock_mode="file", workers additionally serialize on a per-key
+    lock file so only one of them generates while the others wait and
+    re-check the cache.
+    """
+
+    def __init__(self, max_concurrent: int, lock_mode: str = "local", lock_dir: Optional[Path] = None,
+                 lock_poll_seconds: float = 0.1):
+        if lock_mode not in ("local", "file"):
+            raise ValueError(f"Unknown generation lock mode: {lock_mode}")
+        if lock_mode == "file" and fcntl is None:
+            print("File-lock coordination is not supported on this platform; using local mode")
+            lock_mode = "local"
+        self.lock_mode = lock_mode
+        self.lock_dir = lock_dir
+        if self.lock_mode == "file":
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_poll_seconds = lock_poll_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "max_concurrent": max_concurrent,
+            "started": 0,
+            "coalesced": 0,
+            "resolved_by_other_worker": 0,
+            "queued": 0,
+            "in_flight": 0,
+            "total_queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0
+        }
+
+    async def run(self, key: str, generate: Callable[[], Awaitable[Any]],
+                  recheck: Optional[Callable[[], Optional[Any]]] = None) -> Any:
+        """Return the result of generate(), sharing it with concurrent callers of the same key"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["started"] += 1
+            task = asyncio.ensure_future(self._run_limited(key, generate, recheck))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one caller disconnecting does not cancel the shared generation
+        return await asyncio.shield(task)
+
+    @asynccontextmanager
+    async def limit(self):
+        """Hold one of the max_concurrent generation slots, recording queue metrics"""
+        self.stats["queued"] += 1
+        queued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats["queued"] -= 1
+        waited = time.monotonic() - queued_at
+        observe_stage("meal_plan", "generation_queue", waited)
+        self.stats["total_queue_wait_seconds"] += waited
+        self.stats["max_queue_wait_seconds"] = max(self.stats["max_queue_wait_seconds"], waited)
+        self.stats["in_flight"] += 1
+        try:
+            yield
+        finally:
+            self.stats["in_flight"] -= 1
+            self._semaphore.release()
+
+    async def _run_limited(self, key, generate, recheck):
+        async with self.limit():
+            if self.lock_mode == "file":
+                return await self._run_with_file_lock(key, generate, recheck)
+            return await generate()
+
+    async def _run_with_file_lock(self, key, generate, recheck):
+        fd = os.open(self.lock_dir / f"{key}.lock", os.O_CREAT | os.O_RDWR)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(self.lock_poll_seconds)
+            # Another worker may have finished this key while we waited
+            if recheck is not None:
+                result = recheck()
+                if result is not None:
+                    self.stats["resolved_by_other_worker"] += 1
+                    return result
+            return await generate()
+        finally:
+            os.close(fd)  # Closing the descriptor releases the lock
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "lock_mode": self.lock_mode, "inflight_keys": len(self._inflight)}
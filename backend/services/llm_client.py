@@ -0,0 +1,210 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+import asyncio
+import time
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+from services.metrics import OPENAI_CALLS, OPENAI_HEDGES, observe_stage
+from services.rate_limiter import AdaptiveRateLimiter
+
+T = TypeVar("T")
+
+def _retryable(error: Exception) -> bool:
+    """Errors the OpenAI SDK would retry: timeouts, connection errors, 408/409/429 and 5xx"""
+    if isinstance(error, APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(error, APIStatusError) and (status in (408, 409, 429) or status >= 500)
+
+class LatencyTracker:
+    """Rolling window of recent call latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class LLMClient:
+    """Async chat-completion client with its own connection pool and call limit.
+
+    Calls run on the event loop (no executor threads). At most
+    max_concurrent calls are in flight per worker; the rest wait for a
+    slot. With hedging enabled, an attempt still running after the
+    hedge_percentile latency of recent calls gets a second, concurrent
+    attempt, and the first good result wins.
+    """
+
+    def __init__(self, api_key: str, model: str, timeout: float, connect_timeout: float, max_connections: int,
+                 max_keepalive_connections: int, max_concurrent: int, max_retries: int = 2,
+                 hedge_enabled: bool = False, hedge_percentile: float = 0.95, hedge_min_samples: int = 20,
+                 hedge_min_delay: float = 5.0, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 base_url: Optional[str] = None):
+        self.model = model
+        self.rate_limiter = rate_limiter
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=self.timeout,
+            # With a limiter, retries go back through it (see _limited) so it sees every 429/5xx
+            max_retries=0 if rate_limiter is not None else max_retries,
+            http_client=httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections
+                )
+            )
+        )
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+
+    async def close(self):
+        await self.client.close()
+
+    def _record(self, timings: Optional[dict], stage: str, seconds: float):
+        observe_stage("meal_plan", stage, seconds)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @asynccontextmanager
+    async def _limited(self, **kwargs):
+        """Create call holding a rate-limiter slot until the block exits.
+
+        The limiter sees the status and rate-limit headers of every
+        attempt, retries included, and a streamed response keeps its slot
+        until the stream is done.
+        """
+        if self.rate_limiter is None:
+            yield await self.client.chat.completions.create(**kwargs)
+            return
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                raw = await self.client.chat.completions.with_raw_response.create(**kwargs)
+            except Exception as e:
+                response = getattr(e, "response", None)
+                self.rate_limiter.release(getattr(e, "status_code", None), getattr(response, "headers", None))
+                if attempt >= self.max_retries or not _retryable(e):
+                    raise
+                # The limiter adds any Retry-After wait on top of the SDK's usual backoff
+                await asyncio.sleep(min(8.0, 0.5 * 2 ** attempt))
+                continue
+            try:
+                yield raw.parse()
+            finally:
+                self.rate_limiter.release(raw.status_code, raw.headers)
+            return
+
+    async def _create(self, **kwargs) -> Any:
+        async with self._limited(**kwargs) as response:
+            return response
+
+    async def complete(self, messages: List[dict], temperature: float = 0.7, timings: Optional[dict] = None) -> Any:
+        """One chat completion, waiting for a free call slot first; stage times are added to timings"""
+        queued_at = time.perf_counter()
+        async with self._semaphore:
+            self._record(timings, "llm_slot_wait", time.perf_counter() - queued_at)
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                response = await self._create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=self.timeout
+                )
+            except Exception:
+                OPENAI_CALLS.inc(status="error")
+                raise
+            finally:
+                self.in_flight -= 1
+        elapsed = time.perf_counter() - started
+        self.latency.add(elapsed)
+        self._record(timings, "llm", elapsed)
+        OPENAI_CALLS.inc(status="ok")
+        return response
+
+    async def stream(self, messages: List[dict], temperature: float = 0.7):
+        """Yield the text deltas of a streamed chat completion"""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                async with self._limited(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    timeout=self.timeout
+                ) as stream:
+                    try:
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        # Also runs when the consumer stops early, releasing the connection
+                        await stream.close()
+            finally:
+                self.in_flight -= 1
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+
+    async def hedged(self, attempt: Callable[[], Awaitable[T]], is_good: Callable[[T], bool]) -> T:
+        """Run attempt(), starting a second copy if the first is slower than the hedge delay.
+
+        Returns the first result that passes is_good; if neither does,
+        the last result (or the last error) is returned.
+        """
+        tasks = [asyncio.ensure_future(attempt())]
+        try:
+            delay = self.hedge_delay()
+            if delay is None:
+                return await tasks[0]
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+
+            OPENAI_HEDGES.inc(result="fired")
+            tasks.append(asyncio.ensure_future(attempt()))
+            pending = set(tasks)
+            fallback = None
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if is_good(task.result()):
+                        if task is tasks[1]:
+                            OPENAI_HEDGES.inc(result="won")
+                        return task.result()
+                    fallback = (task.result(),)
+            if fallback is not None:
+                return fallback[0]
+            raise error
+        finally:
+            # The losing attempt (or both, if we were cancelled) is abandoned
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
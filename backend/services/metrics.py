@@ -0,0 +1,259 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import threading
+import time
+
+# Upper bounds in seconds; covers sub-millisecond cache lookups up to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Stage durations of the current request, collected for the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+class Gauge(_Metric):
+    """A gauge read from a callback at scrape time (or set directly)"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        if self.callback is not None:
+            try:
+                lines.append(f"{self.name} {_format_value(float(self.callback()))}")
+            except Exception as e:
+                print(f"Metrics callback error for {self.name}: {str(e)}")
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    Each worker process keeps its own registry; scrape every worker (or
+    run a single worker) to see all traffic.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            return self._metrics[metric.name]
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), callback=None) -> Gauge:
+        gauge = self._register(Gauge(name, documentation, labels))
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "foodscores_stage_duration_seconds",
+    "Time spent in each stage of request handling",
+    labels=("service", "stage")
+)
+PLAN_REQUESTS = registry.counter(
+    "foodscores_meal_plan_requests_total",
+    "Meal-plan requests by how they were served",
+    labels=("outcome",)
+)
+PLAN_ATTEMPTS = registry.histogram(
+    "foodscores_meal_plan_generation_attempts",
+    "Generation rounds needed per generated meal plan",
+    buckets=(1, 2, 3)
+)
+OPENAI_CALLS = registry.counter(
+    "foodscores_openai_calls_total",
+    "OpenAI chat completion calls",
+    labels=("status",)
+)
+OPENAI_TOKENS = registry.counter(
+    "foodscores_openai_tokens_total",
+    "OpenAI tokens used",
+    labels=("direction",)
+)
+OPENAI_HEDGES = registry.counter(
+    "foodscores_openai_hedged_requests_total",
+    "Hedged second attempts fired, and how many of them won",
+    labels=("result",)
+)
+EDAMAM_REQUESTS = registry.counter(
+    "foodscores_edamam_lookups_total",
+    "Nutrition lookups by how they were served",
+    labels=("outcome",)
+)
+EDAMAM_RETRIES = registry.counter(
+    "foodscores_edamam_retries_total",
+    "Edamam request retries",
+    labels=("reason",)
+)
+RATE_LIMITED = registry.counter(
+    "foodscores_rate_limited_total",
+    "Requests rejected at admission or answered with a backoff status by the upstream",
+    labels=("upstream", "reason")
+)
+RATE_LIMIT_RATE = registry.gauge(
+    "foodscores_rate_limit_requests_per_second",
+    "Current adaptive request rate per upstream",
+    labels=("upstream",)
+)
+RATE_LIMIT_CONCURRENCY = registry.gauge(
+    "foodscores_rate_limit_concurrency",
+    "Current adaptive concurrency limit per upstream (this worker)",
+    labels=("upstream",)
+)
+EVENT_LOOP_LAG = registry.histogram(
+    "foodscores_event_loop_lag_seconds",
+    "How late the event loop woke a periodic sleep (time other tasks held the loop)"
+)
+
+def _plan_cache_hit_ratio() -> float:
+    hits = PLAN_REQUESTS.value(outcome="cache_hit")
+    total = sum(PLAN_REQUESTS._values.values())
+    return hits / total if total else 0.0
+
+registry.gauge(
+    "foodscores_meal_plan_cache_hit_ratio",
+    "Share of meal-plan requests served from the plan cache",
+    callback=_plan_cache_hit_ratio
+)
+
+def observe_stage(service: str, stage: str, seconds: float):
+    """Record one stage duration in the histogram and in the current request's timings"""
+    STAGE_SECONDS.observe(seconds, service=service, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        name = f"{service}-{stage}"
+        timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def stage_timer(service: str, stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(service, stage, time.perf_counter() - started)
+
+async def monitor_event_loop(interval_seconds: float):
+    """Background task: sleep interval_seconds and record how late the loop woke us"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval_seconds
+        await asyncio.sleep(interval_seconds)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+def start_request_timings() -> Dict[str, float]:
+    """Begin collecting stage timings for the current request (Server-Timing)"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
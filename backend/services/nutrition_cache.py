@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+import asyncio
+import hashlib
+import json
+import os
+import time
+from config import settings
+
+class NutritionCache:
+    """Two-tier (memory LRU + on-disk) cache of Edamam results keyed on normalized ingredient"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or settings.NUTRITION_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = settings.NUTRITION_CACHE_TTL_SECONDS
+        self.max_memory_entries = settings.NUTRITION_CACHE_MAX_MEMORY_ENTRIES
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "writes": 0
+        }
+
+    def _path_for(self, ingredient_key: str) -> Path:
+        digest = hashlib.md5(ingredient_key.encode()).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        return time.time() - stored_at < self.ttl_seconds
+
+    def _remember(self, ingredient_key: str, stored_at: float, data: Dict[Any, Any]):
+        self._memory[ingredient_key] = (stored_at, data)
+        self._memory.move_to_end(ingredient_key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, ingredient_key: str) -> Optional[tuple]:
+        try:
+            with open(self._path_for(ingredient_key), 'r') as f:
+                entry = json.load(f)
+            # Guard against md5 collisions between different ingredients
+            if entry.get("ingredient") != ingredient_key:
+                return None
+            return entry["stored_at"], entry["data"]
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"Nutrition cache read error: {str(e)}")
+            return None
+
+    def _write_disk(self, ingredient_key: str, stored_at: float, data: Dict[Any, Any]):
+        path = self._path_for(ingredient_key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({"ingredient": ingredient_key, "stored_at": stored_at, "data": data}, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Nutrition cache write error: {str(e)}")
+
+    async def get(self, ingredient_key: str) -> Optional[Dict[Any, Any]]:
+        entry = self._memory.get(ingredient_key)
+        if entry is not None:
+            if self._is_fresh(entry[0]):
+                self._memory.move_to_end(ingredient_key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            del self._memory[ingredient_key]
+
+        entry = await asyncio.to_thread(self._read_disk, ingredient_key)
+        if entry is not None:
+            if self._is_fresh(entry[0]):
+                self._remember(ingredient_key, *entry)
+                self.stats["disk_hits"] += 1
+                return entry[1]
+            self.stats["expired"] += 1
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, ingredient_key: str, data: Dict[Any, Any]):
+        stored_at = time.time()
+        self._remember(ingredient_key, stored_at, data)
+        self.stats["writes"] += 1
+        await asyncio.to_thread(self._write_disk, ingredient_key, stored_at, data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
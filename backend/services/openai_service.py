@@ -1,5 +1,16 @@
-from openai import OpenAI
 from config import settings
+from services.llm_client import LLMClient
+from services.rate_limiter import AdaptiveRateLimiter, RateLimited
+from services.plan_cache import PlanCache, make_payload
+from services.cache_backends import create_backend
+from services.generation_coordinator import GenerationCoordinator
+from services.plan_stream import IncrementalPlanParser
+from services.plan_rescaler import PlanRescaler
+from services.dish_library import DishLibrary, PlanSolver
+from services.cache_warmer import CacheWarmer
+from services.request_logger import RequestLogger
+from services.metrics import OPENAI_TOKENS, PLAN_ATTEMPTS, PLAN_REQUESTS, observe_stage, registry
+from models.food import day_errors, plan_errors
 import json
 import asyncio
 import hashlib
@@ -8,10 +19,33 @@ import time
 import random
 from pathlib import Path
 from datetime import datetime
+from utils.helpers import dumps_bytes
 
 class OpenAIService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.llm = LLMClient(
+            settings.OPENAI_API_KEY,
+            model=settings.OPENAI_MODEL,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
+            connect_timeout=settings.OPENAI_CONNECT_TIMEOUT_SECONDS,
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            max_concurrent=settings.OPENAI_MAX_CONCURRENT_CALLS,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            hedge_enabled=settings.OPENAI_HEDGE_ENABLED,
+            hedge_percentile=settings.OPENAI_HEDGE_PERCENTILE,
+            hedge_min_samples=settings.OPENAI_HEDGE_MIN_SAMPLES,
+            hedge_min_delay=settings.OPENAI_HEDGE_MIN_DELAY_SECONDS,
+            rate_limiter=AdaptiveRateLimiter(
+                "openai",
+                per_minute=settings.OPENAI_RATE_LIMIT_PER_MINUTE,
+                burst=settings.OPENAI_RATE_LIMIT_BURST,
+                max_concurrency=settings.OPENAI_MAX_CONCURRENT_CALLS,
+                state_dir=Path(settings.RATE_LIMIT_STATE_DIR),
+                max_wait=settings.RATE_LIMIT_MAX_WAIT_SECONDS
+            ) if settings.RATE_LIMIT_ENABLED else None
+        )
         # Create cache and logs directories
         self.cache_dir = Path("cache")
         self.logs_dir = Path("logs")
@@ -20,49 +54,76 @@ class OpenAIService:
         self.max_cache_per_params = 3  # Store up to 3 variations per parameter set
         self.cache_hit_randomization = 0.1  # Changed to 10%
         self.cache_version = 2  # Add version control
-        self._clear_invalid_cache()  # Clear old cache on startup
+        # Cache entries are validated lazily on first read (or by a background sweep)
+        self.plan_cache = PlanCache(
+            create_backend(settings.PLAN_CACHE_BACKEND, self.cache_dir, Path(settings.PLAN_CACHE_SQLITE_PATH),
+                           self.max_cache_per_params),
+            self.max_cache_per_params,
+            max_entries=settings.PLAN_CACHE_MAX_ENTRIES,
+            max_bytes=settings.PLAN_CACHE_MAX_BYTES,
+            schema_version=self.cache_version,
+            validator=self._is_valid_cached_plan,
+            family_key=self._generate_family_key
+        )
+        self.rescaler = PlanRescaler(
+            self.plan_cache,
+            self._generate_family_key,
+            max_ratio=settings.RESCALE_MAX_RATIO
+        )
+        self.dish_library = DishLibrary()
+        self.plan_solver = PlanSolver(self.dish_library, max_portion_scale=settings.DISH_SOLVER_MAX_PORTION_SCALE)
+        self.request_logger = RequestLogger(
+            self.logs_dir,
+            batch_size=settings.REQUEST_LOG_BATCH_SIZE,
+            flush_interval=settings.REQUEST_LOG_FLUSH_SECONDS,
+            max_bytes=settings.REQUEST_LOG_MAX_BYTES,
+            rotate_daily=settings.REQUEST_LOG_ROTATE_DAILY,
+            backup_count=settings.REQUEST_LOG_BACKUP_COUNT
+        )
+        self.coordinator = GenerationCoordinator(
+            settings.OPENAI_MAX_CONCURRENT_GENERATIONS,
+            lock_mode=settings.GENERATION_LOCK_MODE,
+            lock_dir=Path(settings.GENERATION_LOCK_DIR)
+        )
+        self.cache_warmer = CacheWarmer(
+            self,
+            self.request_logger.log_file,
+            max_keys=settings.PREWARM_MAX_KEYS,
+            token_budget=settings.PREWARM_TOKEN_BUDGET,
+            concurrency=settings.PREWARM_CONCURRENCY,
+            off_peak_hours=settings.PREWARM_OFF_PEAK_HOURS,
+            half_life_hours=settings.PREWARM_HALF_LIFE_HOURS,
+            max_log_bytes=settings.PREWARM_LOG_BYTES
+        )
+        registry.gauge("foodscores_meal_plan_generations_in_flight", "Meal-plan generations holding a slot",
+                       callback=lambda: self.coordinator.stats["in_flight"])
+        registry.gauge("foodscores_meal_plan_generations_queued", "Meal-plan generations waiting for a slot",
+                       callback=lambda: self.coordinator.stats["queued"])
+        registry.gauge("foodscores_openai_calls_in_flight", "OpenAI calls currently in flight",
+                       callback=lambda: self.llm.in_flight)
 
-    def _clear_invalid_cache(self):
-        """Clear all cache files that don't meet current requirements"""
-        try:
-            if not self.cache_dir.exists():
-                return
-                
-            for cache_file in self.cache_dir.glob("*.json"):
-                try:
-                    with open(cache_file, 'r') as f:
-                        data = json.load(f)
-                        
-                    # Validate cached data structure
-                    is_valid = (
-                        isinstance(data, dict) and
-                        'meal_plan' in data and
-                        isinstance(data['meal_plan'], list) and
-                        len(data['meal_plan']) > 0 and
-                        all(
-                            isinstance(day, dict) and
-                            'meals' in day and
-                            len(day['meals']) == 3 and
-                            'total_calories' in day and
-                            all(
-                                isinstance(meal, dict) and
-                                all(key in meal for key in ['type', 'name', 'cuisine', 'calories', 'nutrition', 'ingredients', 'recipe_steps'])
-                                for meal in day['meals']
-                            )
-                            for day in data['meal_plan']
-                        )
-                    )
-                    
-                    if not is_valid:
-                        print(f"Removing invalid cache file: {cache_file}")
-                        cache_file.unlink()
-                        
-                except (json.JSONDecodeError, KeyError, TypeError):
-                    print(f"Removing corrupted cache file: {cache_file}")
-                    cache_file.unlink()
-                    
-        except Exception as e:
-            print(f"Error clearing invalid cache: {str(e)}")
+    def _is_valid_cached_plan(self, raw):
+        """Check a cached plan (raw JSON) against the shared plan models"""
+        errors = plan_errors(raw, macro_tolerance=settings.PLAN_MACRO_TOLERANCE)
+        if errors:
+            print(f"Cached plan failed validation: {errors[0]}")
+        return not errors
+
+    def _plan_errors(self, plan, plan_params):
+        return plan_errors(
+            plan,
+            daily_calories=int(plan_params['dailyCalories']),
+            number_of_days=int(plan_params['numberOfDays']),
+            macro_tolerance=settings.PLAN_MACRO_TOLERANCE
+        )
+
+    def _day_errors(self, days, plan_params):
+        """Problems found in each of a batch of generated days"""
+        return day_errors(
+            days,
+            daily_calories=int(plan_params['dailyCalories']),
+            macro_tolerance=settings.PLAN_MACRO_TOLERANCE
+        )
 
     def _generate_cache_key(self, plan_params):
         # Add version to cache key
@@ -77,210 +138,487 @@ class OpenAIService:
         param_str = json.dumps(base_params, sort_keys=True)
         return hashlib.md5(param_str.encode()).hexdigest()
 
+    def _generate_params_hash(self, plan_params):
+        """Hash of the request params alone, stable across cache version bumps"""
+        param_str = json.dumps({key: plan_params.get(key) for key in sorted(plan_params)}, sort_keys=True)
+        return hashlib.md5(param_str.encode()).hexdigest()
+
+    def _generate_family_key(self, plan_params):
+        """Cache key of everything except dailyCalories, used to find plans worth rescaling"""
+        return self._generate_cache_key({**plan_params, 'dailyCalories': None})
+
+    def _derive_from_neighbor(self, plan_params, cache_key):
+        """Rescale a cached plan with a nearby calorie target instead of calling the LLM"""
+        if not settings.RESCALE_ENABLED:
+            return None
+        try:
+            plan = self.rescaler.derive(plan_params)
+        except Exception as e:
+            print(f"Plan rescaling error: {str(e)}")
+            return None
+        if plan is None:
+            return None
+        errors = self._plan_errors(plan, plan_params)
+        if errors:
+            print(f"Derived plan failed validation: {errors[0]}")
+            return None
+        return make_payload(dumps_bytes(plan), cache_key, None)
+
+    def _compose_from_library(self, plan_params, cache_key):
+        """Assemble a plan from individual cached dishes instead of calling the LLM"""
+        if not settings.DISH_SOLVER_ENABLED or not self.dish_library.ready:
+            return None
+        if len(self.dish_library) < settings.DISH_SOLVER_MIN_DISHES:
+            return None
+        try:
+            per_day_cuisines = self._split_cuisine_counts(
+                self._cuisine_counts(plan_params), int(plan_params['numberOfDays'])
+            )
+            plan = self.plan_solver.solve(plan_params, per_day_cuisines)
+        except Exception as e:
+            print(f"Dish library solver error: {str(e)}")
+            return None
+        if plan is None:
+            return None
+        errors = self._plan_errors(plan, plan_params)
+        if errors:
+            print(f"Derived plan failed validation: {errors[0]}")
+            return None
+        return make_payload(dumps_bytes(plan), cache_key, None)
+
     def _get_cached_response(self, cache_key):
         try:
-            variation_files = list(self.cache_dir.glob(f"{cache_key}_v*.json"))
+            variations = self.plan_cache.variations(cache_key)
+            if not variations:
+                # Another worker may have cached this key since our index was built
+                self.plan_cache.refresh(cache_key)
+                variations = self.plan_cache.variations(cache_key)
             
-            if variation_files:
+            if variations:
                 if random.random() > self.cache_hit_randomization:
-                    chosen_file = random.choice(variation_files)
-                    with open(chosen_file, 'r') as f:
-                        data = json.load(f)
-                        self._log_request(cache_key, "cache_hit", 0)
-                        return data
+                    payload = self.plan_cache.load_payload(cache_key, random.choice(variations))
+                    if payload is not None:
+                        return payload
             return None
         except Exception as e:
             print(f"Cache read error: {str(e)}")
             return None
 
-    def _save_to_cache(self, cache_key, response):
+    def _save_to_cache(self, cache_key, response, plan_params=None):
         try:
-            variation_files = list(self.cache_dir.glob(f"{cache_key}_v*.json"))
-            
-            if len(variation_files) >= self.max_cache_per_params:
-                file_to_replace = random.choice(variation_files)
-                file_to_replace.unlink()
-            
-            variation_num = len(variation_files)
-            cache_file = self.cache_dir / f"{cache_key}_v{variation_num}.json"
-            
-            with open(cache_file, 'w') as f:
-                json.dump(response, f, indent=2)
+            self.dish_library.add_plan(response, plan_params)
+        except Exception as e:
+            print(f"Dish library update error: {str(e)}")
+        try:
+            return self.plan_cache.save(cache_key, response, params=plan_params)
         except Exception as e:
             print(f"Cache write error: {str(e)}")
+            return make_payload(dumps_bytes(response), cache_key, None)
 
-    def _log_request(self, cache_key, request_type, duration):
+    def _log_request(self, cache_key, request_type, duration, **fields):
+        """Queue a log entry; extra fields (params_hash, params, attempts, tokens, timings) are kept when set"""
         try:
-            log_file = self.logs_dir / "request_logs.jsonl"
             log_entry = {
                 "timestamp": datetime.now().isoformat(),
                 "cache_key": cache_key,
                 "type": request_type,
                 "duration_seconds": duration
             }
-            with open(log_file, 'a') as f:
-                f.write(json.dumps(log_entry) + '\n')
+            log_entry.update((key, value) for key, value in fields.items() if value is not None)
+            self.request_logger.log(log_entry)
+            if request_type == "prewarm":
+                return  # Background fills are not user requests
+            PLAN_REQUESTS.inc(outcome=request_type)
+            if request_type == "api_call" and fields.get("attempts"):
+                PLAN_ATTEMPTS.observe(fields["attempts"])
         except Exception as e:
             print(f"Logging error: {str(e)}")
 
+    def _get_new_variation(self, cache_key, known_variations):
+        """Return a variation another worker cached for this key since known_variations was taken"""
+        self.plan_cache.refresh(cache_key)
+        new_variations = set(self.plan_cache.variations(cache_key)) - known_variations
+        if new_variations:
+            return self.plan_cache.load_payload(cache_key, random.choice(list(new_variations)))
+        return None
+
     async def generate_meal_plan(self, plan_params):
+        payload = await self.generate_meal_plan_payload(plan_params)
+        return json.loads(payload.body)
+
+    async def generate_meal_plan_payload(self, plan_params):
+        """Return the plan as a PlanPayload of pre-serialized JSON bytes, from cache when possible"""
+        start_time = time.perf_counter()
+        cache_key = self._generate_cache_key(plan_params)
+        params_hash = self._generate_params_hash(plan_params)
+
         try:
-            start_time = time.time()
-            cache_key = self._generate_cache_key(plan_params)
-            
-            try:
-                cached_response = self._get_cached_response(cache_key)
-                if cached_response:
-                    return cached_response
-            except Exception as e:
-                print(f"Cache retrieval error: {str(e)}")
-
-            # Calculate cuisine distribution
-            cuisine_counts = {}
-            estimated_meals = int(plan_params['numberOfDays']) * 3  # Base estimate
-            
-            for cuisine in plan_params['cuisinePreferences']:
-                if ':' in cuisine:
-                    name, percentage = cuisine.split(':')
-                    percentage = int(percentage.strip('%'))
-                    cuisine_counts[name] = round((percentage/100) * estimated_meals)
-                else:
-                    cuisine_counts[cuisine] = estimated_meals // len(plan_params['cuisinePreferences'])
-
-            cuisine_distribution = [f"{cuisine}:{count} meals" for cuisine, count in cuisine_counts.items()]
-
-            system_prompt = """You are a nutritionist and meal planner. You must respond with ONLY valid JSON, exactly matching this structure, no additional text:
-            {
-                "meal_plan": [
-                    {
-                        "day": 1,
-                        "meals": [
-                            {
-                                "type": "string (meal type, e.g., breakfast, morning snack, lunch, etc.)",
-                                "name": "Dish Name",
-                                "cuisine": "Cuisine Type",
-                                "calories": 500,
-                                "nutrition": {
-                                    "protein": "20g",
-                                    "carbs": "60g",
-                                    "fat": "15g"
-                                }
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response:
+                elapsed = time.perf_counter() - start_time
+                observe_stage("meal_plan", "cache_lookup", elapsed)
+                self._log_request(cache_key, "cache_hit", elapsed, params_hash=params_hash,
+                                  timings={"cache_lookup": elapsed})
+                return cached_response
+        except Exception as e:
+            print(f"Cache retrieval error: {str(e)}")
+        cache_lookup = time.perf_counter() - start_time
+        observe_stage("meal_plan", "cache_lookup", cache_lookup)
+
+        # With nothing cached for this exact key, try rescaling a nearby calorie target
+        if not self.plan_cache.variations(cache_key):
+            for request_type, derive in (("derived", self._derive_from_neighbor),
+                                         ("composed", self._compose_from_library)):
+                stage_start = time.perf_counter()
+                derived = derive(plan_params, cache_key)
+                stage_time = time.perf_counter() - stage_start
+                observe_stage("meal_plan", request_type, stage_time)
+                if derived is not None:
+                    self._log_request(cache_key, request_type, time.perf_counter() - start_time,
+                                      params_hash=params_hash, params=plan_params,
+                                      timings={"cache_lookup": cache_lookup, request_type: stage_time})
+                    return derived
+
+        # Concurrent misses on the same key share one generation
+        known_variations = set(self.plan_cache.variations(cache_key))
+        return await self.coordinator.run(
+            cache_key,
+            lambda: self._generate_and_cache(plan_params, cache_key, params_hash),
+            recheck=lambda: self._get_new_variation(cache_key, known_variations)
+        )
+
+    def _cuisine_counts(self, plan_params):
+        # Calculate cuisine distribution
+        cuisine_counts = {}
+        estimated_meals = int(plan_params['numberOfDays']) * 3  # Base estimate
+        
+        for cuisine in plan_params['cuisinePreferences']:
+            if ':' in cuisine:
+                name, percentage = cuisine.split(':')
+                percentage = int(percentage.strip('%'))
+                cuisine_counts[name] = round((percentage/100) * estimated_meals)
+            else:
+                cuisine_counts[cuisine] = estimated_meals // len(plan_params['cuisinePreferences'])
+        return cuisine_counts
+
+    def _split_cuisine_counts(self, cuisine_counts, num_days):
+        """Spread the plan's cuisine counts over its days so every chunk gets its share.
+
+        Uses largest remainders per cuisine, rotating the starting day so
+        leftover meals of different cuisines land on different days.
+        """
+        per_day = [{} for _ in range(num_days)]
+        for offset, (cuisine, count) in enumerate(cuisine_counts.items()):
+            base, remainder = divmod(count, num_days)
+            for day in range(num_days):
+                extra = 1 if (day - offset) % num_days < remainder else 0
+                if base + extra:
+                    per_day[day][cuisine] = base + extra
+        return per_day
+
+    def _build_prompts(self, plan_params, num_days=None, first_day=1, cuisine_counts=None):
+        num_days = num_days or int(plan_params['numberOfDays'])
+        if cuisine_counts is None:
+            cuisine_counts = self._cuisine_counts(plan_params)
+
+        cuisine_distribution = [f"{cuisine}:{count} meals" for cuisine, count in cuisine_counts.items()]
+
+        system_prompt = """You are a nutritionist and meal planner. You must respond with ONLY valid JSON, exactly matching this structure, no additional text:
+        {
+            "meal_plan": [
+                {
+                    "day": 1,
+                    "meals": [
+                        {
+                            "type": "string (meal type, e.g., breakfast, morning snack, lunch, etc.)",
+                            "name": "Dish Name",
+                            "cuisine": "Cuisine Type",
+                            "calories": 500,
+                            "nutrition": {
+                                "protein": "20g",
+                                "carbs": "60g",
+                                "fat": "15g"
                             }
-                        ],
-                        "total_calories": 2000
-                    }
-                ],
-                "generation_time": 0
-            }"""
+                        }
+                    ],
+                    "total_calories": 2000
+                }
+            ],
+            "generation_time": 0
+        }"""
 
-            user_prompt = f"""Create a {plan_params['numberOfDays']}-day meal plan with these STRICT requirements:
+        user_prompt = f"""Create a {num_days}-day meal plan with these STRICT requirements:
 
-            CORE REQUIREMENTS:
-            - EXACTLY {plan_params['numberOfDays']} days
-            - EXACTLY {plan_params['dailyCalories']} calories (±50) per day
-            - Health Requirements: {', '.join(plan_params['healthConditions']) if plan_params['healthConditions'] else 'None'}
+        CORE REQUIREMENTS:
+        - EXACTLY {num_days} days, numbered {first_day} to {first_day + num_days - 1}
+        - EXACTLY {plan_params['dailyCalories']} calories (±50) per day
+        - Health Requirements: {', '.join(plan_params['healthConditions']) if plan_params['healthConditions'] else 'None'}
 
-            MEAL STRUCTURE:
-            - Distribute daily calories across appropriate number of meals
-            - Can include main meals (breakfast, lunch, dinner) and snacks
-            - Number of meals should be practical and appropriate for calorie target
-            - For higher calorie targets, consider adding snacks between meals
-            - For lower calorie targets, might need fewer but satisfying meals
+        MEAL STRUCTURE:
+        - Distribute daily calories across appropriate number of meals
+        - Can include main meals (breakfast, lunch, dinner) and snacks
+        - Number of meals should be practical and appropriate for calorie target
+        - For higher calorie targets, consider adding snacks between meals
+        - For lower calorie targets, might need fewer but satisfying meals
 
-            CUISINE DISTRIBUTION:
-            {', '.join(cuisine_distribution)}
+        CUISINE DISTRIBUTION:
+        {', '.join(cuisine_distribution)}
 
-            FOCUS ON:
-            1. Accurate calorie counts
-            2. Balanced nutrition throughout the day
-            3. Practical meal timing and portions
-            4. Appropriate meal frequency for calorie target
+        FOCUS ON:
+        1. Accurate calorie counts
+        2. Balanced nutrition throughout the day
+        3. Practical meal timing and portions
+        4. Appropriate meal frequency for calorie target
 
-            For health conditions:
-            - Adapt dishes to meet restrictions
-            - Balance nutrients appropriately
-            - Ensure suitable portions"""
+        For health conditions:
+        - Adapt dishes to meet restrictions
+        - Balance nutrients appropriately
+        - Ensure suitable portions"""
 
-            loop = asyncio.get_event_loop()
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
 
-            for attempt in range(3):
-                try:
-                    print(f"Attempt {attempt + 1} to generate meal plan")
-                    
-                    response = await loop.run_in_executor(
-                        None,
-                        lambda: self.client.chat.completions.create(
-                            model="gpt-4",
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_prompt}
-                            ],
-                            temperature=0.7
-                        )
-                    )
-
-                    response_content = response.choices[0].message.content.strip()
-                    print(f"Raw response start: {response_content[:200]}...")
-                    
-                    if response_content.startswith("```json"):
-                        response_content = response_content[7:]
-                    if response_content.startswith("```"):
-                        response_content = response_content[3:]
-                    if response_content.endswith("```"):
-                        response_content = response_content[:-3]
-                    
-                    response_content = response_content.strip()
-                    
-                    try:
-                        parsed_response = json.loads(response_content)
-                    except json.JSONDecodeError as e:
-                        print(f"JSON parsing error: {str(e)}")
-                        print(f"Cleaned response content: {response_content}")
-                        continue
-
-                    # Validate structure
-                    if not isinstance(parsed_response, dict) or 'meal_plan' not in parsed_response:
-                        print("Invalid response structure")
-                        continue
-
-                    if not isinstance(parsed_response['meal_plan'], list):
-                        print("meal_plan is not a list")
-                        continue
-
-                    # Validate days
-                    if len(parsed_response['meal_plan']) != int(plan_params['numberOfDays']):
-                        print(f"Wrong number of days: got {len(parsed_response['meal_plan'])}, expected {plan_params['numberOfDays']}")
-                        continue
-
-                    # Validate each day
-                    valid_plan = True
-                    for day in parsed_response['meal_plan']:
-                        if not all(key in day for key in ['day', 'meals', 'total_calories']):
-                            print(f"Missing required keys in day: {day.keys()}")
-                            valid_plan = False
-                            break
+    def _clean_response_content(self, response_content):
+        response_content = response_content.strip()
+        if response_content.startswith("```json"):
+            response_content = response_content[7:]
+        if response_content.startswith("```"):
+            response_content = response_content[3:]
+        if response_content.endswith("```"):
+            response_content = response_content[:-3]
+        return response_content.strip()
 
-                        if abs(day['total_calories'] - int(plan_params['dailyCalories'])) > 50:
-                            print(f"Calories out of range in day {day['day']}: {day['total_calories']}")
-                            valid_plan = False
-                            break
+    def _chunk_days(self, day_numbers):
+        chunk_size = settings.PLAN_CHUNK_DAYS or len(day_numbers)
+        return [day_numbers[i:i + chunk_size] for i in range(0, len(day_numbers), chunk_size)]
 
-                    if not valid_plan:
-                        continue
+    def _check_admission(self):
+        """Reject a new generation right away when the OpenAI budget cannot serve it in time"""
+        if self.llm.rate_limiter is not None:
+            self.llm.rate_limiter.check_admission()
 
-                    # If we get here, the plan is valid
-                    parsed_response['generation_time'] = time.time() - start_time
-                    self._save_to_cache(cache_key, parsed_response)
-                    return parsed_response
+    def _new_run_stats(self):
+        # Per-generation counters for the request log; stage timings are summed over chunks
+        return {"attempts": 0, "llm_calls": 0,
+                "tokens": {"prompt": 0, "completion": 0, "total": 0},
+                "timings": {"prompt_build": 0.0, "llm": 0.0, "parse": 0.0, "validate": 0.0}}
 
-                except Exception as e:
-                    print(f"Error in attempt {attempt + 1}: {str(e)}")
-                    if attempt == 2:  # Last attempt
-                        raise
+    def _add_timing(self, run_stats, stage, started, ended=None):
+        elapsed = (ended if ended is not None else time.perf_counter()) - started
+        observe_stage("meal_plan", stage, elapsed)
+        if run_stats is not None:
+            run_stats["timings"][stage] = run_stats["timings"].get(stage, 0.0) + elapsed
+
+    async def _generate_chunk(self, plan_params, day_numbers, per_day_cuisines, semaphore, run_stats=None):
+        """Generate a run of consecutive days in one LLM call; returns {day number: valid day}"""
+        stage_start = time.perf_counter()
+        cuisine_counts = {}
+        for day_number in day_numbers:
+            for cuisine, count in per_day_cuisines[day_number - 1].items():
+                cuisine_counts[cuisine] = cuisine_counts.get(cuisine, 0) + count
+        messages = self._build_prompts(plan_params, len(day_numbers), day_numbers[0], cuisine_counts)
+        self._add_timing(run_stats, "prompt_build", stage_start)
+
+        stage_start = time.perf_counter()
+        async with semaphore:
+            self._add_timing(run_stats, "chunk_wait", stage_start)
+            # A hedged second attempt only wins if it returns every requested day
+            return await self.llm.hedged(
+                lambda: self._request_chunk(messages, plan_params, day_numbers, run_stats),
+                is_good=lambda valid_days: len(valid_days) == len(day_numbers)
+            )
 
-            raise Exception("Failed to generate valid meal plan after 3 attempts")
+    async def _request_chunk(self, messages, plan_params, day_numbers, run_stats=None):
+        """One LLM call for a chunk, parsed and validated; returns {day number: valid day}"""
+        response = await self.llm.complete(messages, timings=run_stats["timings"] if run_stats else None)
+
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        OPENAI_TOKENS.inc(prompt_tokens, direction="prompt")
+        OPENAI_TOKENS.inc(completion_tokens, direction="completion")
+        if run_stats is not None:
+            run_stats["llm_calls"] += 1
+            run_stats["tokens"]["prompt"] += prompt_tokens
+            run_stats["tokens"]["completion"] += completion_tokens
+            run_stats["tokens"]["total"] += getattr(usage, "total_tokens", 0) or prompt_tokens + completion_tokens
+
+        stage_start = time.perf_counter()
+        response_content = response.choices[0].message.content.strip()
+        print(f"Raw response start (days {day_numbers[0]}-{day_numbers[-1]}): {response_content[:200]}...")
+        response_content = self._clean_response_content(response_content)
+
+        try:
+            parsed_response = json.loads(response_content)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error: {str(e)}")
+            print(f"Cleaned response content: {response_content}")
+            return {}
+        finally:
+            self._add_timing(run_stats, "parse", stage_start)
+
+        # Validate structure
+        if not isinstance(parsed_response, dict) or not isinstance(parsed_response.get('meal_plan'), list):
+            print("Invalid response structure")
+            return {}
+
+        valid_days = {}
+        # Days are matched by position; missing or extra days are simply not returned
+        days = parsed_response['meal_plan'][:len(day_numbers)]
+        stage_start = time.perf_counter()
+        errors_per_day = self._day_errors(days, plan_params)
+        self._add_timing(run_stats, "validate", stage_start)
+        for day_number, day, errors in zip(day_numbers, days, errors_per_day):
+            if errors:
+                print(errors[0])
+                continue
+            day['day'] = day_number
+            valid_days[day_number] = day
+        return valid_days
+
+    async def _generate_and_cache(self, plan_params, cache_key, params_hash=None, run_stats=None, log_type="api_call"):
+        """Generate the plan in concurrent chunks, regenerating only the days that fail validation"""
+        run_stats = run_stats if run_stats is not None else self._new_run_stats()
+        start_time = time.time()
+        try:
+            self._check_admission()
+            num_days = int(plan_params['numberOfDays'])
+            per_day_cuisines = self._split_cuisine_counts(self._cuisine_counts(plan_params), num_days)
+            semaphore = asyncio.Semaphore(settings.PLAN_MAX_PARALLEL_CHUNKS)
+            days = {}
+            pending = list(range(1, num_days + 1))
+
+            for attempt in range(3):
+                run_stats["attempts"] = attempt + 1
+                chunks = self._chunk_days(pending)
+                print(f"Attempt {attempt + 1} to generate meal plan: days {pending} in {len(chunks)} chunks")
+                results = await asyncio.gather(
+                    *(self._generate_chunk(plan_params, chunk, per_day_cuisines, semaphore, run_stats) for chunk in chunks),
+                    return_exceptions=True
+                )
+                last_error = None
+                for result in results:
+                    if isinstance(result, RateLimited):
+                        # Our own limiter already waited as long as allowed; retrying would only queue again
+                        raise result
+                    if isinstance(result, Exception):
+                        print(f"Error in attempt {attempt + 1}: {str(result)}")
+                        last_error = result
+                    else:
+                        days.update(result)
 
+                pending = [day_number for day_number in pending if day_number not in days]
+                if not pending:
+                    # If we get here, every day is valid
+                    meal_plan = {
+                        "meal_plan": [days[day_number] for day_number in range(1, num_days + 1)],
+                        "generation_time": time.time() - start_time
+                    }
+                    stage_start = time.perf_counter()
+                    payload = self._save_to_cache(cache_key, meal_plan, plan_params)
+                    self._add_timing(run_stats, "cache_write", stage_start)
+                    self._log_request(cache_key, log_type, time.time() - start_time,
+                                      params_hash=params_hash, params=plan_params, **run_stats)
+                    return payload
+
+                if attempt == 2 and last_error is not None:  # Last attempt
+                    raise last_error
+
+            raise Exception(f"Failed to generate valid meal plan after 3 attempts (days {pending} invalid)")
+
+        except RateLimited as e:
+            self._log_request(cache_key, "rate_limited", time.time() - start_time,
+                              params_hash=params_hash, params=plan_params, error=str(e), **run_stats)
+            raise
         except Exception as e:
             print(f"Detailed error: {str(e)}")
-            self._log_request(cache_key, "error", time.time() - start_time)
-            raise Exception(f"Failed to generate meal plan: {str(e)}") 
\ No newline at end of file
+            self._log_request(cache_key, "error", time.time() - start_time,
+                              params_hash=params_hash, params=plan_params, error=str(e), **run_stats)
+            raise Exception(f"Failed to generate meal plan: {str(e)}")
+
+    async def stream_meal_plan(self, plan_params):
+        """Yield the plan day by day as {"event": ..., "data": ...} dicts.
+
+        Events are "day" (one validated day), "reset" (an attempt failed and
+        the days sent so far should be discarded), "done" (the plan is
+        complete and cached) and "error".
+        """
+        lookup_start = time.perf_counter()
+        cache_key = self._generate_cache_key(plan_params)
+        params_hash = self._generate_params_hash(plan_params)
+
+        try:
+            cached_response = self._get_cached_response(cache_key)
+        except Exception as e:
+            print(f"Cache retrieval error: {str(e)}")
+            cached_response = None
+        if cached_response:
+            elapsed = time.perf_counter() - lookup_start
+            self._log_request(cache_key, "cache_hit", elapsed, params_hash=params_hash,
+                              timings={"cache_lookup": elapsed})
+            # Cached plans are streamed the same way so clients need one code path
+            plan = json.loads(cached_response.body)
+            for day in plan['meal_plan']:
+                yield {"event": "day", "data": day}
+            yield {"event": "done", "data": {"cached": True, "etag": cached_response.etag,
+                                             "generation_time": plan.get('generation_time', 0)}}
+            return
+
+        start_time = time.time()
+        try:
+            self._check_admission()
+        except RateLimited as e:
+            self._log_request(cache_key, "rate_limited", time.time() - start_time,
+                              params_hash=params_hash, params=plan_params)
+            yield {"event": "error", "data": {"detail": str(e), "retry_after": e.retry_after}}
+            return
+        messages = self._build_prompts(plan_params)
+        async with self.coordinator.limit():
+            for attempt in range(3):
+                attempts = attempt + 1
+                print(f"Attempt {attempt + 1} to stream meal plan")
+                parser = IncrementalPlanParser()
+                days = []
+                failure = None
+                deltas = self.llm.stream(messages)
+                try:
+                    async for delta in deltas:
+                        try:
+                            completed = parser.feed(delta)
+                        except json.JSONDecodeError as e:
+                            failure = f"JSON parsing error: {str(e)}"
+                            break
+                        for day, errors in zip(completed, self._day_errors(completed, plan_params)):
+                            if errors:
+                                failure = errors[0]
+                                break
+                            days.append(day)
+                            yield {"event": "day", "data": day}
+                        if failure is not None:
+                            break
+                except Exception as e:
+                    failure = str(e)
+                finally:
+                    # Close the upstream stream if the client went away or the attempt failed
+                    await deltas.aclose()
+
+                if failure is None and len(days) != int(plan_params['numberOfDays']):
+                    failure = f"Wrong number of days: got {len(days)}, expected {plan_params['numberOfDays']}"
+                if failure is None:
+                    plan = {"meal_plan": days, "generation_time": time.time() - start_time}
+                    payload = self._save_to_cache(cache_key, plan, plan_params)
+                    self._log_request(cache_key, "api_call", time.time() - start_time,
+                                      params_hash=params_hash, params=plan_params, attempts=attempts, streamed=True)
+                    yield {"event": "done", "data": {"cached": False, "etag": payload.etag,
+                                                     "generation_time": plan['generation_time']}}
+                    return
+
+                print(f"Error in streaming attempt {attempt + 1}: {failure}")
+                if attempt < 2:
+                    yield {"event": "reset", "data": {"reason": failure}}
+
+        self._log_request(cache_key, "error", time.time() - start_time,
+                          params_hash=params_hash, params=plan_params, attempts=3, streamed=True)
+        yield {"event": "error", "data": {"detail": "Failed to generate valid meal plan after 3 attempts"}}
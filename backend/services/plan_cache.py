@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, NamedTuple, Optional
+import asyncio
+import hashlib
+import json
+from services.cache_backends import CacheBackend, STATUS_VALID, new_meta, plan_summary
+from utils.helpers import dumps_bytes
+
+class PlanPayload(NamedTuple):
+    """A cached plan as ready-to-send UTF-8 JSON bytes"""
+    body: bytes
+    cache_key: str
+    variation: Optional[int]
+    etag: str
+
+def make_payload(body: bytes, cache_key: str, variation: Optional[int]) -> PlanPayload:
+    # Slots can be rewritten in place, so the tag also covers the content
+    digest = hashlib.md5(body).hexdigest()[:12]
+    slot = f"-v{variation}" if variation is not None else ""
+    return PlanPayload(body, cache_key, variation, f'"{cache_key}{slot}-{digest}"')
+
+class PlanCache:
+    """In-process index of cached meal plans with a bounded LRU of serialized plans.
+
+    Storage is delegated to a CacheBackend. The index is built from the
+    backend's metadata (schema version, validation status, request params)
+    on first use, so nothing is parsed at startup. Entries are validated
+    lazily on their first read, or ahead of time by sweep().
+    """
+
+    def __init__(self, backend: CacheBackend, max_variations: int, max_entries: int, max_bytes: int,
+                 schema_version: int = 0, validator: Optional[Callable[[bytes], bool]] = None,
+                 family_key: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.backend = backend
+        self.max_variations = max_variations
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.schema_version = schema_version
+        self.validator = validator
+        self.family_key = family_key
+        self._index: Optional[Dict[str, Dict[int, Dict[str, Any]]]] = None
+        # family key -> {cache_key: dailyCalories}, kept in step with the index
+        self._families: Dict[str, Dict[str, int]] = {}
+        self._key_families: Dict[str, str] = {}
+        self._lru: "OrderedDict[tuple, PlanPayload]" = OrderedDict()
+        self._lru_bytes = 0
+
+    @property
+    def index(self) -> Dict[str, Dict[int, Dict[str, Any]]]:
+        # Built from backend metadata on first use, then kept current by save/discard
+        if self._index is None:
+            self._set_index(self.backend.list_entries())
+        return self._index
+
+    async def load_index(self) -> Dict[str, Dict[int, Dict[str, Any]]]:
+        """The index, listing the backend in a worker thread if it has not been built yet"""
+        if self._index is None:
+            entries = await asyncio.to_thread(self.backend.list_entries)
+            # A request may have built the index on the loop while we were listing
+            if self._index is None:
+                self._set_index(entries)
+        return self._index
+
+    def _set_index(self, entries: Dict[tuple, Dict[str, Any]]):
+        index: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        for (cache_key, variation), meta in entries.items():
+            index.setdefault(cache_key, {})[variation] = meta
+        self._index = index
+        self._families = {}
+        self._key_families = {}
+        for cache_key, slots in index.items():
+            self._add_family(cache_key, slots)
+
+    # Families: cached keys whose params differ only in dailyCalories
+
+    def _add_family(self, cache_key: str, slots: Dict[int, Dict[str, Any]]):
+        if self.family_key is None or cache_key in self._key_families:
+            return
+        # Variations of one key share params
+        params = next((meta["params"] for meta in slots.values() if meta.get("params")), None)
+        if params is None:
+            return
+        try:
+            family, calories = self.family_key(params), int(params['dailyCalories'])
+        except (KeyError, TypeError, ValueError):
+            return
+        self._families.setdefault(family, {})[cache_key] = calories
+        self._key_families[cache_key] = family
+
+    def _drop_family(self, cache_key: str):
+        family = self._key_families.pop(cache_key, None)
+        if family is not None:
+            members = self._families.get(family, {})
+            members.pop(cache_key, None)
+            if not members:
+                self._families.pop(family, None)
+
+    def family(self, family: str) -> Dict[str, int]:
+        """{cache_key: dailyCalories} of the cached keys in a family"""
+        self.index  # Make sure the families have been built
+        return self._families.get(family, {})
+
+    def refresh(self, cache_key: str):
+        """Re-read the variations of one key, e.g. after another worker wrote to it"""
+        slots = self.backend.list_variations(cache_key)
+        for variation in self.index.get(cache_key, {}):
+            # A slot may have been rewritten in place, so drop every in-memory copy
+            self._lru_drop((cache_key, variation))
+        self._drop_family(cache_key)
+        if slots:
+            self.index[cache_key] = slots
+            self._add_family(cache_key, slots)
+        else:
+            self.index.pop(cache_key, None)
+
+    def variations(self, cache_key: str) -> List[int]:
+        return list(self.index.get(cache_key, {}))
+
+    # LRU
+
+    def _lru_put(self, payload: PlanPayload):
+        lru_key = (payload.cache_key, payload.variation)
+        self._lru_drop(lru_key)
+        if len(payload.body) > self.max_bytes:
+            return
+        self._lru[lru_key] = payload
+        self._lru_bytes += len(payload.body)
+        while self._lru and (len(self._lru) > self.max_entries or self._lru_bytes > self.max_bytes):
+            _, evicted = self._lru.popitem(last=False)
+            self._lru_bytes -= len(evicted.body)
+
+    def _lru_drop(self, lru_key: tuple):
+        payload = self._lru.pop(lru_key, None)
+        if payload is not None:
+            self._lru_bytes -= len(payload.body)
+
+    # Reads and writes
+
+    def _read_validated(self, cache_key: str, variation: int) -> Optional[PlanPayload]:
+        """Read one variation from the backend, validating and evicting it if it was never checked"""
+        meta = self.index.get(cache_key, {}).get(variation)
+        if meta is None:
+            return None
+        raw = self.backend.read(cache_key, variation)
+        if raw is None:
+            # Removed behind our back (e.g. clear_cache); forget it
+            self._forget(cache_key, variation)
+            return None
+
+        if meta["status"] != STATUS_VALID:
+            if not self._is_valid(raw):
+                print(f"Removing invalid cached plan: {cache_key}_v{variation}")
+                self.discard(cache_key, variation)
+                return None
+            meta.update(status=STATUS_VALID, schema_version=self.schema_version)
+            if not meta.get("summary"):
+                try:
+                    meta["summary"] = plan_summary(json.loads(raw), len(raw))
+                except (json.JSONDecodeError, AttributeError):
+                    pass
+            self.backend.set_meta(cache_key, variation, meta)
+        return make_payload(raw, cache_key, variation)
+
+    def _is_valid(self, raw: bytes) -> bool:
+        if self.validator is not None:
+            return self.validator(raw)
+        try:
+            json.loads(raw)
+            return True
+        except json.JSONDecodeError:
+            return False
+
+    def load_payload(self, cache_key: str, variation: int) -> Optional[PlanPayload]:
+        payload = self._lru.get((cache_key, variation))
+        if payload is not None:
+            self._lru.move_to_end((cache_key, variation))
+            return payload
+
+        payload = self._read_validated(cache_key, variation)
+        if payload is not None:
+            self._lru_put(payload)
+        return payload
+
+    def load(self, cache_key: str, variation: int) -> Optional[Dict[str, Any]]:
+        """Parsed copy of a cached plan; the hot path serves load_payload bytes instead"""
+        payload = self.load_payload(cache_key, variation)
+        return json.loads(payload.body) if payload is not None else None
+
+    def save(self, cache_key: str, plan: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> PlanPayload:
+        body = dumps_bytes(plan)
+        # Plans are validated before they are saved
+        meta = new_meta(self.schema_version, STATUS_VALID, params, plan_summary(plan, len(body)))
+        variation = self.backend.write(cache_key, body, meta, self.max_variations)
+        slots = self.index.setdefault(cache_key, {})
+        slots[variation] = meta
+        self._add_family(cache_key, slots)
+        payload = make_payload(body, cache_key, variation)
+        self._lru_put(payload)
+        return payload
+
+    def _forget(self, cache_key: str, variation: int):
+        slots = self.index.get(cache_key, {})
+        slots.pop(variation, None)
+        if not slots:
+            self.index.pop(cache_key, None)
+            self._drop_family(cache_key)
+        self._lru_drop((cache_key, variation))
+
+    def discard(self, cache_key: str, variation: int):
+        self.backend.delete(cache_key, variation)
+        self._forget(cache_key, variation)
+
+    async def sweep(self, pause_seconds: float = 0.01):
+        """Validate every unchecked entry in the background, yielding between entries"""
+        unchecked = [
+            (cache_key, variation)
+            for cache_key, slots in list(self.index.items())
+            for variation, meta in list(slots.items())
+            if meta["status"] != STATUS_VALID
+        ]
+        for cache_key, variation in unchecked:
+            self._read_validated(cache_key, variation)
+            await asyncio.sleep(pause_seconds)
+        return len(unchecked)
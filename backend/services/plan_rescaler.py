@@ -0,0 +1,85 @@
+from typing import Any, Callable, Dict, Optional
+import copy
+import random
+from models.food import parse_grams, format_grams
+
+def rescale_day(day: Dict[str, Any], target_calories: int) -> Dict[str, Any]:
+    """Scale one day's meals so their calories add up to exactly target_calories"""
+    meals = day['meals']
+    source_total = sum(meal['calories'] for meal in meals)
+    if source_total <= 0:
+        raise ValueError(f"Day {day.get('day')} has no meal calories to scale")
+    scale = target_calories / source_total
+
+    for meal in meals:
+        meal['calories'] = round(meal['calories'] * scale)
+        meal['portion_scale'] = round(meal.get('portion_scale', 1.0) * scale, 3)
+        for macro, value in list(meal.get('nutrition', {}).items()):
+            grams = parse_grams(value)
+            if grams is not None:
+                meal['nutrition'][macro] = format_grams(grams * scale)
+
+    # Put the rounding residual on the largest meal so the day hits the target exactly
+    residual = target_calories - sum(meal['calories'] for meal in meals)
+    if residual:
+        max(meals, key=lambda meal: meal['calories'])['calories'] += residual
+    day['total_calories'] = target_calories
+    return day
+
+def rescale_plan(plan: Dict[str, Any], target_calories: int) -> Dict[str, Any]:
+    """Return a copy of plan with every day rescaled to target_calories"""
+    rescaled = copy.deepcopy(plan)
+    for day in rescaled['meal_plan']:
+        rescale_day(day, target_calories)
+    return rescaled
+
+class PlanRescaler:
+    """Derives plans for a calorie target from cached plans with the same other params.
+
+    A cached plan qualifies when its params differ only in dailyCalories
+    and that target lies within max_ratio of the requested one.
+    """
+
+    def __init__(self, plan_cache, family_key: Callable[[Dict[str, Any]], str], max_ratio: float):
+        self.plan_cache = plan_cache
+        self.family_key = family_key
+        self.max_ratio = max_ratio
+
+    def find_neighbor(self, plan_params: Dict[str, Any]) -> Optional[tuple]:
+        """Closest cached (cache_key, params) for the same family within the calorie band"""
+        target = int(plan_params['dailyCalories'])
+        best = None
+        for cache_key, source in self.plan_cache.family(self.family_key(plan_params)).items():
+            distance = abs(source - target)
+            if source > 0 and distance / source <= self.max_ratio and (best is None or distance < best[0]):
+                best = (distance, cache_key)
+        if best is None:
+            return None
+        slots = self.plan_cache.index.get(best[1], {})
+        params = next((meta["params"] for meta in slots.values() if meta.get("params")), None)
+        return (best[1], params) if params is not None else None
+
+    def derive(self, plan_params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        neighbor = self.find_neighbor(plan_params)
+        if neighbor is None:
+            return None
+        cache_key, params = neighbor
+        variations = self.plan_cache.variations(cache_key)
+        if not variations:
+            return None
+        variation = random.choice(variations)
+        source_plan = self.plan_cache.load(cache_key, variation)
+        if source_plan is None:
+            return None
+
+        target = int(plan_params['dailyCalories'])
+        plan = rescale_plan(source_plan, target)
+        plan['generation_time'] = 0
+        plan['derived'] = {
+            "method": "rescaled",
+            "source_cache_key": cache_key,
+            "source_variation": variation,
+            "source_calories": int(params['dailyCalories']),
+            "target_calories": target
+        }
+        return plan
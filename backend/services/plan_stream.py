@@ -0,0 +1,75 @@
+from typing import Any, Dict, List
+import json
+
+class IncrementalPlanParser:
+    """Pulls complete day objects out of a streamed {"meal_plan": [...]} JSON document.
+
+    Text is fed in arbitrary chunks (as it arrives from the model). The
+    parser tracks strings, escapes and nesting, and returns each element
+    of the top-level "meal_plan" array as soon as its closing brace
+    arrives. Anything before the first "{" (such as a ```json fence) is
+    ignored.
+    """
+
+    def __init__(self, array_key: str = "meal_plan"):
+        self.array_key = array_key
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_key = None
+        self._array_depth = None
+        self._item_start = None
+        self._position = 0
+        self._text = ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk and return the days completed by it"""
+        completed = []
+        self._text += chunk
+        text = self._text
+        for i in range(self._position, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._array_depth is None:
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._last_key == self.array_key:
+                    self._array_depth = self._depth
+                elif char == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif char in "}]":
+                if char == "}" and self._item_start is not None and self._depth == self._array_depth + 1:
+                    completed.append(json.loads(text[self._item_start:i + 1]))
+                    self._item_start = None
+                if char == "]" and self._depth == self._array_depth:
+                    self._array_depth = None
+                    self._last_key = None
+                self._depth -= 1
+
+        # Keep only the unfinished item (or key) so the buffer does not grow with the plan
+        if self._item_start is not None:
+            keep_from = self._item_start
+        elif self._in_string:
+            keep_from = self._string_start
+        else:
+            keep_from = len(text)
+        self._text = text[keep_from:]
+        self._position = len(self._text)
+        if self._item_start is not None:
+            self._item_start -= keep_from
+        if self._in_string:
+            self._string_start -= keep_from
+        return completed
@@ -0,0 +1,233 @@
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Mapping, Optional
+import asyncio
+import os
+import re
+import struct
+import time
+from services.metrics import RATE_LIMITED, RATE_LIMIT_CONCURRENCY, RATE_LIMIT_RATE, observe_stage
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is kept per worker instead of shared
+    fcntl = None
+
+# tokens, updated_at, current rate (per second), blocked_until
+_STATE = struct.Struct("<dddd")
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+BACKOFF_STATUS_CODES = {429, 503}
+
+class RateLimited(Exception):
+    """Raised at admission when an upstream slot is not expected within the allowed wait"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} rate limit reached; retry in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from "20", "1.5", "20ms", "6m0s" or "1h2m3s" style header values"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+class AdaptiveRateLimiter:
+    """Token bucket plus AIMD concurrency limit for one upstream.
+
+    The bucket (tokens, current rate, and a "blocked until" time taken
+    from Retry-After / x-ratelimit-* headers) lives in a small file under
+    state_dir, updated under flock, so every uvicorn worker draws from the
+    same budget. The rate backs off multiplicatively on 429/503 and
+    recovers additively on success; the per-worker concurrency limit does
+    the same. Callers wait for a slot up to max_wait seconds and get
+    RateLimited otherwise.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: int, max_concurrency: int, state_dir: Optional[Path],
+                 max_wait: float = 10.0, min_concurrency: int = 1, min_rate_fraction: float = 0.05):
+        self.name = name
+        self.max_rate = per_minute / 60.0
+        self.min_rate = self.max_rate * min_rate_fraction
+        self.burst = max(1, burst)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_wait = max_wait
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self._waiters: deque = deque()
+        self._fd = None
+        self._local_state = (float(self.burst), time.time(), self.max_rate, 0.0)
+        if state_dir is not None and fcntl is not None:
+            state_dir.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(state_dir / f"{name}.state", os.O_CREAT | os.O_RDWR)
+        RATE_LIMIT_RATE.set(self.max_rate, upstream=name)
+        RATE_LIMIT_CONCURRENCY.set(self.concurrency_limit, upstream=name)
+
+    # Shared bucket state
+
+    @contextmanager
+    def _state(self):
+        """Yield the current state as a list; changes are written back on exit"""
+        if self._fd is None:
+            state = list(self._local_state)
+            yield state
+            self._local_state = tuple(state)
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            raw = os.pread(self._fd, _STATE.size, 0)
+            state = list(_STATE.unpack(raw)) if len(raw) == _STATE.size else list(self._local_state)
+            yield state
+            os.pwrite(self._fd, _STATE.pack(*state), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _refill(self, state, now):
+        tokens, updated_at, rate, _ = state
+        # Another worker (or an older config) may have left a rate above our ceiling
+        state[2] = rate = min(max(rate, self.min_rate), self.max_rate)
+        state[0] = min(self.burst, tokens + max(0.0, now - updated_at) * rate)
+        state[1] = now
+
+    def _take_token(self) -> float:
+        """Take a token if one is available; otherwise return the seconds until one should be"""
+        now = time.time()
+        with self._state() as state:
+            self._refill(state, now)
+            if now < state[3]:
+                return state[3] - now
+            if state[0] >= 1:
+                state[0] -= 1
+                return 0.0
+            return (1 - state[0]) / state[2]
+
+    def estimated_wait(self) -> float:
+        """Seconds a new request would wait for a token, counting this worker's queue"""
+        now = time.time()
+        with self._state() as state:
+            self._refill(state, now)
+            blocked = max(0.0, state[3] - now)
+            deficit = self.waiting + 1 - state[0]
+            return max(blocked, deficit / state[2] if deficit > 0 else 0.0)
+
+    def check_admission(self):
+        """Reject fast when a slot is not expected within max_wait"""
+        wait = self.estimated_wait()
+        if wait > self.max_wait:
+            RATE_LIMITED.inc(upstream=self.name, reason="rejected")
+            raise RateLimited(self.name, wait)
+
+    # Acquire / release
+
+    async def acquire(self, max_wait: Optional[float] = None):
+        """Wait for a concurrency slot and a token, or raise RateLimited past the deadline"""
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else max_wait)
+        self.waiting += 1
+        try:
+            while self.in_flight >= int(self.concurrency_limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    RATE_LIMITED.inc(upstream=self.name, reason="rejected")
+                    raise RateLimited(self.name, 1.0)
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+            self.in_flight += 1
+            try:
+                while True:
+                    wait = self._take_token()
+                    if wait <= 0:
+                        break
+                    if time.monotonic() + wait > deadline:
+                        RATE_LIMITED.inc(upstream=self.name, reason="rejected")
+                        raise RateLimited(self.name, wait)
+                    await asyncio.sleep(wait)
+            except BaseException:
+                self._release_slot()
+                raise
+        finally:
+            self.waiting -= 1
+        observe_stage(self.name, "rate_limit_wait", time.monotonic() - started)
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def release(self, status: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        """Return the slot and adapt to the upstream's answer"""
+        self._release_slot()
+        if status is not None or headers:
+            self.record(status, headers)
+
+    def record(self, status: Optional[int], headers: Optional[Mapping[str, str]] = None):
+        now = time.time()
+        backoff = status in BACKOFF_STATUS_CODES
+        if backoff:
+            RATE_LIMITED.inc(upstream=self.name, reason=f"upstream_{status}")
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+        elif status is not None and status < 400:
+            self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+        RATE_LIMIT_CONCURRENCY.set(self.concurrency_limit, upstream=self.name)
+
+        block_for = self._header_block(headers, backoff)
+        with self._state() as state:
+            self._refill(state, now)
+            if backoff:
+                state[2] = max(self.min_rate, state[2] / 2)
+                state[0] = min(state[0], 0.0)
+            elif status is not None and status < 400:
+                state[2] = min(self.max_rate, state[2] + self.max_rate / 20)
+            remaining = self._header_number(headers, "x-ratelimit-remaining-requests")
+            if remaining is not None:
+                state[0] = min(state[0], remaining)
+            if block_for:
+                state[3] = max(state[3], now + block_for)
+            rate = state[2]
+        RATE_LIMIT_RATE.set(rate, upstream=self.name)
+
+    def _header_number(self, headers, name) -> Optional[float]:
+        value = headers.get(name) if headers else None
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def _header_block(self, headers, backoff: bool) -> Optional[float]:
+        """How long the upstream asked us to stay away, from Retry-After or exhausted x-ratelimit budgets"""
+        if not headers:
+            return None
+        if backoff:
+            retry_after = parse_duration(headers.get("retry-after"))
+            if retry_after is not None:
+                return retry_after
+        blocks = []
+        for budget in ("requests", "tokens"):
+            if self._header_number(headers, f"x-ratelimit-remaining-{budget}") == 0:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{budget}"))
+                if reset is not None:
+                    blocks.append(reset)
+        return max(blocks) if blocks else None
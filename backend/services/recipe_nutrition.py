@@ -0,0 +1,313 @@
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+from services.dish_library import normalize_label
+from utils.helpers import normalize_ingredient
+
+# Columns of the table; Edamam totalNutrients codes, except calories and weight
+NUTRIENTS = (
+    ("calories", "kcal", None),
+    ("weight", "g", None),
+    ("protein", "g", "PROCNT"),
+    ("fat", "g", "FAT"),
+    ("carbs", "g", "CHOCDF"),
+    ("fiber", "g", "FIBTG"),
+    ("sugar", "g", "SUGAR"),
+    ("sodium", "mg", "NA"),
+)
+
+MAGIC = b"RNUT"
+VERSION = 1
+# magic, version, nutrient count, record count, slot count
+_HEADER = struct.Struct("<4sHHII")
+# key hash, record index + 1 (0 = empty), key offset, key length
+_SLOT = struct.Struct("<QIIH")
+# nutrients (float32), ingredient lines, resolved lines, title offset, title length
+_RECORD = struct.Struct("<" + "f" * len(NUTRIENTS) + "HHIH")
+
+_RECIPE_SUFFIX_RE = re.compile(r"\s+recipes?$")
+
+def split_ingredients(text: str) -> List[str]:
+    """Ingredient lines from the scraper's Ingredients column, which holds one per line"""
+    return [line.strip() for line in (text or "").splitlines() if line.strip()]
+
+def dish_keys(title: str) -> List[str]:
+    """Lookup keys for a recipe title: "Set Dosa Recipe | Sponge Dosa" -> ["set dosa", "sponge dosa"]"""
+    keys = []
+    for part in str(title).split("|"):
+        key = _RECIPE_SUFFIX_RE.sub("", normalize_label(part))
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+def nutrient_vector(data: Dict[str, Any]) -> Tuple[float, ...]:
+    """The table's columns from one Edamam nutrition-data response"""
+    nutrients = data.get("totalNutrients") or {}
+    values = []
+    for name, _, code in NUTRIENTS:
+        if name == "calories":
+            value = data.get("calories")
+        elif name == "weight":
+            value = data.get("totalWeight")
+        else:
+            value = (nutrients.get(code) or {}).get("quantity")
+        values.append(float(value or 0.0))
+    return tuple(values)
+
+class TableWriter:
+    """Writes the table one record at a time, for use as a context manager.
+
+    Packed records and their titles are appended to temporary files next
+    to the table as they come in; only the dish keys are kept in memory.
+    On a clean exit the hash index is built from them and header, index,
+    records and strings are copied into the table, which is replaced
+    atomically, so a running backend keeps reading its mapped copy of the
+    old table until it reopens the file. On an error the old table stays.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._keys: Dict[str, int] = {}
+        self._titles_size = 0
+        self._records = None
+        self._titles = None
+
+    def __enter__(self) -> "TableWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._records = tempfile.TemporaryFile(dir=self.path.parent)
+        self._titles = tempfile.TemporaryFile(dir=self.path.parent)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._finish()
+        finally:
+            self._records.close()
+            self._titles.close()
+
+    def add(self, recipe: Dict[str, Any]):
+        """Append one {"title", "nutrients", "ingredients", "resolved"} record"""
+        title = str(recipe["title"]).encode()[:0xFFFF]
+        self._records.write(_RECORD.pack(*recipe["nutrients"], min(recipe["ingredients"], 0xFFFF),
+                                         min(recipe["resolved"], 0xFFFF), self._titles_size, len(title)))
+        self._titles.write(title)
+        self._titles_size += len(title)
+        for key in dish_keys(recipe["title"]):
+            self._keys[key] = self.count  # A later recipe with the same name wins
+        self.count += 1
+
+    def _finish(self):
+        slot_count = 1
+        while slot_count < 2 * max(1, len(self._keys)):
+            slot_count *= 2
+        # Key strings follow the titles in the strings section
+        key_strings = bytearray()
+        slots = bytearray(slot_count * _SLOT.size)
+        for key, index in self._keys.items():
+            encoded = key.encode()[:0xFFFF]
+            key_hash = _key_hash(key)
+            slot = key_hash & (slot_count - 1)
+            while _SLOT.unpack_from(slots, slot * _SLOT.size)[1]:
+                slot = (slot + 1) & (slot_count - 1)
+            _SLOT.pack_into(slots, slot * _SLOT.size, key_hash, index + 1,
+                            self._titles_size + len(key_strings), len(encoded))
+            key_strings += encoded
+
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, VERSION, len(NUTRIENTS), self.count, slot_count))
+                f.write(slots)
+                for part in (self._records, self._titles):
+                    part.seek(0)
+                    shutil.copyfileobj(part, f)
+                f.write(key_strings)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+def write_table(path: Path, recipes: Iterable[Dict[str, Any]]) -> int:
+    """Write {"title", "nutrients", "ingredients", "resolved"} records; returns the record count"""
+    with TableWriter(path) as writer:
+        for recipe in recipes:
+            writer.add(recipe)
+    return writer.count
+
+class RecipeNutritionTable:
+    """Read-only, memory-mapped per-recipe nutrition table.
+
+    Layout: header, an open-addressing hash index of dish keys (load
+    factor <= 0.5), fixed-size records of float32 nutrient totals, then
+    the key and title strings. A lookup hashes the normalized dish name,
+    probes a few slots and unpacks one record, without reading the rest
+    of the file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self.record_count = 0
+        self.slot_count = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._map is not None
+
+    def open(self) -> bool:
+        """Map the table file; returns False if there is none (yet) or it is unreadable"""
+        self.close()
+        try:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            self.close()
+            return False
+        if len(self._map) < _HEADER.size:
+            return self._reject("truncated header")
+        magic, version, nutrient_count, self.record_count, self.slot_count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or nutrient_count != len(NUTRIENTS):
+            return self._reject("unexpected format")
+        self._records_at = _HEADER.size + self.slot_count * _SLOT.size
+        self._strings_at = self._records_at + self.record_count * _RECORD.size
+        if len(self._map) < self._strings_at or self.slot_count & (self.slot_count - 1):
+            return self._reject("truncated or corrupt index")
+        return True
+
+    def _reject(self, reason: str) -> bool:
+        print(f"Ignoring recipe nutrition table ({reason}): {self.path}")
+        self.close()
+        return False
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.record_count = 0
+        self.slot_count = 0
+
+    def __len__(self):
+        return self.record_count
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_at + offset
+        return self._map[start:start + length].decode(errors="replace")
+
+    def _record(self, index: int) -> Dict[str, Any]:
+        values = _RECORD.unpack_from(self._map, self._records_at + index * _RECORD.size)
+        nutrients = values[:len(NUTRIENTS)]
+        ingredients, resolved, title_offset, title_length = values[len(NUTRIENTS):]
+        return {
+            "title": self._string(title_offset, title_length),
+            "nutrients": {name: {"quantity": round(value, 2), "unit": unit}
+                          for (name, unit, _), value in zip(NUTRIENTS, nutrients)},
+            "ingredients": ingredients,
+            "resolved_ingredients": resolved
+        }
+
+    def get(self, dish_name: str) -> Optional[Dict[str, Any]]:
+        """Nutrition totals for a whole recipe by dish name, or None"""
+        if self._map is None or not self.slot_count:
+            return None
+        keys = dish_keys(dish_name)
+        if not keys:
+            return None
+        key = keys[0]
+        key_hash = _key_hash(key)
+        mask = self.slot_count - 1
+        slot = key_hash & mask
+        for _ in range(self.slot_count):
+            stored_hash, index, key_offset, key_length = _SLOT.unpack_from(self._map, _HEADER.size + slot * _SLOT.size)
+            if index == 0:
+                return None
+            if stored_hash == key_hash and self._string(key_offset, key_length) == key:
+                return self._record(index - 1)
+            slot = (slot + 1) & mask
+        return None
+
+class RecipeNutritionIngester:
+    """Totals the nutrition of scraped recipes from their ingredient lines.
+
+    Recipes are read batch_size at a time; the distinct ingredient lines
+    of a batch that were not seen before go to EdamamService in one
+    get_batch_nutrition call (which serves repeats from the nutrition
+    cache and bounds concurrency), and the batch's records are yielded
+    for writing, so memory stays flat and each line is looked up once per
+    run.
+    """
+
+    def __init__(self, edamam_service, batch_size: int = 50, concurrency: Optional[int] = None):
+        self.edamam = edamam_service
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        # normalized line -> nutrient vector, or None when the lookup failed
+        self._lines: Dict[str, Optional[Tuple[float, ...]]] = {}
+        self.stats = {"recipes": 0, "lines": 0, "unique_lines": 0, "failed_lines": 0}
+
+    async def ingest(self, rows: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield table records batch by batch, to be written out as they come (see TableWriter)"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                for recipe in await self._ingest_batch(batch):
+                    yield recipe
+                batch = []
+        if batch:
+            for recipe in await self._ingest_batch(batch):
+                yield recipe
+
+    async def _ingest_batch(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        parsed = []
+        new_lines = []
+        for row in rows:
+            lines = [normalize_ingredient(line) for line in split_ingredients(row.get("Ingredients", ""))]
+            lines = [line for line in lines if line]
+            parsed.append((row.get("Title") or "", lines))
+            for line in lines:
+                if line not in self._lines:
+                    self._lines[line] = None
+                    new_lines.append(line)
+
+        if new_lines:
+            result = await self.edamam.get_batch_nutrition(new_lines, concurrency=self.concurrency)
+            for item in result["items"]:
+                if item["status"] == "ok":
+                    self._lines[item["normalized"]] = nutrient_vector(item["data"])
+                else:
+                    self.stats["failed_lines"] += 1
+            self.stats["unique_lines"] += len(new_lines)
+
+        recipes = []
+        for title, lines in parsed:
+            if not dish_keys(title):
+                continue
+            totals = [0.0] * len(NUTRIENTS)
+            resolved = 0
+            for line in lines:
+                vector = self._lines.get(line)
+                # Edamam answers 200 with zero weight for lines it could not parse
+                if vector is None or not vector[1]:
+                    continue
+                resolved += 1
+                for i, value in enumerate(vector):
+                    totals[i] += value
+            recipes.append({"title": title, "nutrients": totals, "ingredients": len(lines), "resolved": resolved})
+            self.stats["lines"] += len(lines)
+        self.stats["recipes"] += len(recipes)
+        return recipes
@@ -0,0 +1,125 @@
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import asyncio
+import gzip
+import json
+import os
+import shutil
+
+class RequestLogger:
+    """Queue-backed JSONL request log with batched background writes and rotation.
+
+    log() only appends to an in-memory queue. A background task started
+    from the app lifespan flushes the queue when it reaches batch_size
+    entries or every flush_interval seconds, writing in a worker thread.
+    The active file is rotated when it exceeds max_bytes or the day
+    changes; rotated files are gzip-compressed and the oldest removed
+    beyond backup_count.
+    """
+
+    def __init__(self, log_dir: Path, filename: str = "request_logs.jsonl", batch_size: int = 100,
+                 flush_interval: float = 1.0, max_bytes: int = 50 * 1024 * 1024, rotate_daily: bool = True,
+                 backup_count: int = 14, compress: bool = True, max_queue: int = 100_000):
+        self.log_dir = log_dir
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.log_file = log_dir / filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.backup_count = backup_count
+        self.compress = compress
+        self._queue: deque = deque(maxlen=max_queue)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"logged": 0, "written": 0, "dropped": 0, "flushes": 0, "rotations": 0, "errors": 0}
+
+    def log(self, entry: Dict[str, Any]):
+        """Queue one entry; never touches the filesystem on the caller's path"""
+        if len(self._queue) == self._queue.maxlen:
+            self.stats["dropped"] += 1
+        self._queue.append(entry)
+        self.stats["logged"] += 1
+        if self._task is None:
+            # No background writer (scripts, tests): write synchronously in batches
+            if len(self._queue) >= self.batch_size:
+                self.flush_now()
+        elif len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background writer and flush whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush_now)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._queue:
+                await asyncio.to_thread(self._write_batch, self._drain())
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        while self._queue:
+            batch.append(self._queue.popleft())
+        return batch
+
+    def flush_now(self):
+        if self._queue:
+            self._write_batch(self._drain())
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        try:
+            self._rotate_if_needed()
+            data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in batch)
+            with open(self.log_file, 'a') as f:
+                f.write(data)
+            self.stats["written"] += len(batch)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Logging error: {str(e)}")
+
+    def _rotate_if_needed(self):
+        try:
+            stat = self.log_file.stat()
+        except FileNotFoundError:
+            return
+        too_big = stat.st_size >= self.max_bytes
+        new_day = self.rotate_daily and datetime.fromtimestamp(stat.st_mtime).date() != datetime.now().date()
+        if not (too_big or new_day) or stat.st_size == 0:
+            return
+
+        stamp = datetime.fromtimestamp(stat.st_mtime).strftime("%Y%m%d-%H%M%S-%f")
+        rotated = self.log_file.with_name(f"{self.log_file.stem}-{stamp}-{os.getpid()}{self.log_file.suffix}")
+        suffix = 1
+        while rotated.exists() or Path(f"{rotated}.gz").exists():
+            rotated = self.log_file.with_name(f"{self.log_file.stem}-{stamp}-{os.getpid()}-{suffix}{self.log_file.suffix}")
+            suffix += 1
+        os.replace(self.log_file, rotated)
+        if self.compress:
+            with open(rotated, 'rb') as source, gzip.open(f"{rotated}.gz", 'wb') as target:
+                shutil.copyfileobj(source, target)
+            rotated.unlink()
+        self.stats["rotations"] += 1
+
+        backups = sorted(self.log_dir.glob(f"{self.log_file.stem}-*"))
+        for old in backups[:max(0, len(backups) - self.backup_count)]:
+            old.unlink(missing_ok=True)
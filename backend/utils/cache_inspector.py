@@ -1,30 +1,55 @@
+from datetime import datetime, timedelta
 from pathlib import Path
 import json
+import sys
 import click
 
+if __name__ == '__main__' and not __package__:
+    # Run as a script (python utils/cache_inspector.py): make the backend packages importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import settings
+from services.cache_backends import create_backend
+from utils.log_stats import LogAggregates
+
 @click.group()
 def cli():
     """Cache inspection utility"""
     pass
 
 @cli.command()
-def list_cache():
+@click.option('--backend', type=click.Choice(['json', 'sqlite']), default=settings.PLAN_CACHE_BACKEND,
+              show_default=True, help='Plan cache backend to list')
+@click.option('--sqlite-path', default=settings.PLAN_CACHE_SQLITE_PATH, show_default=True,
+              help='SQLite store (with --backend sqlite)')
+def list_cache(backend, sqlite_path):
     """List all cached meal plans"""
     cache_dir = Path("cache")
     if not cache_dir.exists():
         print("Cache directory not found!")
         return
-    
-    for cache_file in cache_dir.glob("*.json"):
-        with open(cache_file, 'r') as f:
-            data = json.load(f)
-            print(f"\nCache Key: {cache_file.stem}")
-            # Print summary of the meal plan
-            days = len(data['meal_plan'])
-            total_meals = sum(len(day['meals']) for day in data['meal_plan'])
-            print(f"Days: {days}")
-            print(f"Total Meals: {total_meals}")
-            print("-" * 50)
+
+    # Metadata only (the .meta sidecars or the SQLite index); plan bodies are never read
+    entries = create_backend(backend, cache_dir, Path(sqlite_path)).list_entries()
+    by_key = {}
+    for (cache_key, variation), meta in sorted(entries.items()):
+        by_key.setdefault(cache_key, []).append((variation, meta))
+
+    for cache_key, variations in by_key.items():
+        print(f"\nCache Key: {cache_key}")
+        params = next((meta["params"] for _, meta in variations if meta.get("params")), None)
+        if params:
+            print(f"Params: {params['numberOfDays']} days, {params['dailyCalories']} kcal, "
+                  f"{', '.join(params['cuisinePreferences'])}")
+        for variation, meta in variations:
+            summary = meta.get("summary")
+            if summary:
+                details = f"{summary['days']} days, {summary['meals']} meals, {summary['bytes']} bytes"
+            else:
+                details = "no summary recorded"
+            print(f"  v{variation}: {details} [{meta.get('status')}]")
+        print("-" * 50)
+    print(f"\n{len(entries)} cached plans under {len(by_key)} keys")
 
 @cli.command()
 @click.argument('cache_key')
@@ -39,37 +64,72 @@ def view_cache(cache_key):
         data = json.load(f)
         print(json.dumps(data, indent=2))
 
+def _window_start(value):
+    """Accept an ISO timestamp or a relative span such as 30m, 6h or 7d"""
+    if value is None:
+        return None
+    units = {"m": "minutes", "h": "hours", "d": "days"}
+    if value[-1:] in units and value[:-1].isdigit():
+        return (datetime.now() - timedelta(**{units[value[-1]]: int(value[:-1])})).isoformat()
+    return datetime.fromisoformat(value).isoformat()
+
+def _format_quantiles(sketch):
+    p50, p95, p99 = (sketch.quantile(q) for q in (0.5, 0.95, 0.99))
+    return f"p50 {p50:.3f}s  p95 {p95:.3f}s  p99 {p99:.3f}s  mean {sketch.mean:.3f}s"
+
 @cli.command()
-def view_stats():
+@click.option('--since', help='Start of the window: ISO time or relative (30m, 6h, 7d); rounded to the hour')
+@click.option('--until', help='End of the window: ISO time or relative; rounded to the hour')
+@click.option('--top', default=10, help='Number of cache keys to show')
+@click.option('--reset', is_flag=True, help='Discard saved aggregates and re-read the whole log')
+def view_stats(since, until, top, reset):
     """View request statistics"""
     log_file = Path("logs") / "request_logs.jsonl"
-    if not log_file.exists():
+    state_file = Path("logs") / ".stats_state.json"
+    if not log_file.exists() and not state_file.exists():
         print("No logs found!")
         return
-    
-    cache_hits = 0
-    api_calls = 0
-    errors = 0
-    total_api_duration = 0
-    
-    with open(log_file, 'r') as f:
-        for line in f:
-            entry = json.loads(line.strip())
-            if entry['type'] == 'cache_hit':
-                cache_hits += 1
-            elif entry['type'] == 'api_call':
-                api_calls += 1
-                total_api_duration += entry['duration_seconds']
-            elif entry['type'] == 'error':
-                errors += 1
-    
+
+    # Only the part of the log written since the last run is parsed
+    aggregates = LogAggregates(log_file, state_file)
+    if not reset:
+        aggregates.load_state()
+    added = aggregates.update()
+    aggregates.save_state()
+
+    since, until = _window_start(since), _window_start(until)
+    by_type = aggregates.by_type(since, until)
+
+    def count(event_type):
+        return by_type[event_type].count if event_type in by_type else 0
+
+    cache_hits = count('cache_hit')
+    api_calls = count('api_call')
+    derived = count('derived') + count('composed')
+
+    print(f"\nRead {added} new log entries")
     print("\nCache Statistics:")
     print(f"Cache Hits: {cache_hits}")
+    print(f"Derived Plans: {derived}")
     print(f"API Calls: {api_calls}")
-    print(f"Errors: {errors}")
-    if api_calls > 0:
-        print(f"Average API Call Duration: {total_api_duration/api_calls:.2f} seconds")
-    print(f"Cache Hit Rate: {cache_hits/(cache_hits+api_calls)*100:.1f}%")
+    print(f"Errors: {count('error')}")
+    served = cache_hits + derived + api_calls
+    if served:
+        print(f"Cache Hit Rate: {(cache_hits + derived) / served * 100:.1f}%")
+
+    print("\nLatency by event type:")
+    for event_type, sketch in sorted(by_type.items()):
+        print(f"  {event_type:<10} {sketch.count:>8}  {_format_quantiles(sketch)}")
+
+    tokens = aggregates.tokens(since, until)
+    if tokens:
+        print("\nTokens: " + ", ".join(f"{direction} {total}" for direction, total in sorted(tokens.items())))
+
+    by_key = aggregates.by_key(since, until)
+    if by_key and top:
+        print(f"\nTop {top} cache keys by requests:")
+        for (event_type, cache_key), sketch in sorted(by_key.items(), key=lambda item: -item[1].count)[:top]:
+            print(f"  {cache_key} {event_type:<10} {sketch.count:>6}  {_format_quantiles(sketch)}")
 
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
@@ -1,29 +1,49 @@
 from pathlib import Path
-import shutil
+import sys
 import click
 
+if __name__ == '__main__' and not __package__:
+    # Run as a script (python utils/clear_cache.py): make the backend packages importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import settings
+from services.cache_backends import create_backend
+
 @click.command()
 @click.option('--force', is_flag=True, help='Force clear all cache without confirmation')
-def clear_cache(force):
-    """Clear all cached meal plans"""
+@click.option('--backend', type=click.Choice(['json', 'sqlite']), default=settings.PLAN_CACHE_BACKEND,
+              show_default=True, help='Plan cache backend to clear')
+@click.option('--sqlite-path', default=settings.PLAN_CACHE_SQLITE_PATH, show_default=True,
+              help='SQLite store (with --backend sqlite)')
+def clear_cache(force, backend, sqlite_path):
+    """Clear all cached meal plans.
+
+    Only plan entries are removed; the nutrition cache, rate-limit state,
+    locks and recipe nutrition table that also live under cache/ are kept.
+    """
     cache_dir = Path("cache")
-    
+
     if not cache_dir.exists():
         print("Cache directory not found!")
         return
-        
+    if backend == 'sqlite' and not Path(sqlite_path).exists():
+        print(f"SQLite cache not found: {sqlite_path}")
+        return
+
     if not force:
         confirm = input("Are you sure you want to clear all cached meal plans? (y/N): ")
         if confirm.lower() != 'y':
             print("Operation cancelled.")
             return
-    
+
     try:
-        shutil.rmtree(cache_dir)
-        cache_dir.mkdir()
-        print("Cache cleared successfully!")
+        store = create_backend(backend, cache_dir, Path(sqlite_path))
+        entries = store.list_entries()
+        for cache_key, variation in entries:
+            store.delete(cache_key, variation)
+        print(f"Cache cleared successfully! ({len(entries)} plans removed)")
     except Exception as e:
         print(f"Error clearing cache: {str(e)}")
 
 if __name__ == '__main__':
-    clear_cache() 
\ No newline at end of file
+    clear_cache()
@@ -0,0 +1,43 @@
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib encoder
+    orjson = None
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# "100g" -> "100 g" so the unit can be matched as its own token
+_NUMBER_UNIT_RE = re.compile(r"(\d)([a-z]+)\b")
+_QUANTITY_RE = re.compile(r"^[\d./\-]+$")
+
+UNIT_ALIASES = {
+    "g": "gram", "gm": "gram", "gms": "gram", "gr": "gram", "grams": "gram",
+    "kg": "kilogram", "kgs": "kilogram", "kilograms": "kilogram",
+    "mg": "milligram", "milligrams": "milligram",
+    "ml": "milliliter", "millilitre": "milliliter", "milliliters": "milliliter", "millilitres": "milliliter",
+    "l": "liter", "litre": "liter", "liters": "liter", "litres": "liter",
+    "tsp": "teaspoon", "tsps": "teaspoon", "teaspoons": "teaspoon",
+    "tbsp": "tablespoon", "tbsps": "tablespoon", "tbs": "tablespoon", "tablespoons": "tablespoon",
+    "oz": "ounce", "ounces": "ounce",
+    "lb": "pound", "lbs": "pound", "pounds": "pound",
+    "cups": "cup", "c": "cup",
+    "pcs": "piece", "pc": "piece", "pieces": "piece",
+}
+
+def normalize_ingredient(line: str) -> str:
+    """Normalize an ingredient line so equivalent lines dedupe to one lookup"""
+    line = _WHITESPACE_RE.sub(" ", line).strip().lower()
+    line = _NUMBER_UNIT_RE.sub(r"\1 \2", line)
+    tokens = line.split(" ")
+    # Only a token that follows a quantity is treated as a unit ("1 c milk", not "vitamin c")
+    for i in range(1, len(tokens)):
+        if _QUANTITY_RE.match(tokens[i - 1]):
+            tokens[i] = UNIT_ALIASES.get(tokens[i].rstrip("."), tokens[i])
+    return " ".join(tokens)
+
+def dumps_bytes(obj) -> bytes:
+    """Encode obj as compact UTF-8 JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
@@ -0,0 +1,54 @@
+from pathlib import Path
+import asyncio
+import csv
+import click
+from config import settings
+from services.edamam import EdamamService
+from services.recipe_nutrition import RecipeNutritionIngester, TableWriter
+
+def iter_rows(path: Path):
+    """Stream rows from the scraper's CSV file or Parquet part directory"""
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq  # Only needed for Parquet input
+        parts = sorted(path.glob("part-*.parquet")) if path.is_dir() else [path]
+        for part in parts:
+            for batch in pq.ParquetFile(part).iter_batches(columns=["Title", "Ingredients"]):
+                yield from batch.to_pylist()
+        return
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+@click.command()
+@click.argument('input_path', type=click.Path(exists=True, path_type=Path))
+@click.option('--output', default=None, help='Table to write (default: RECIPE_NUTRITION_TABLE)')
+@click.option('--batch-size', default=50, help='Recipes whose new ingredient lines are looked up together')
+@click.option('--concurrency', type=int, default=None, help='Concurrent Edamam lookups (default: EDAMAM_BATCH_CONCURRENCY)')
+@click.option('--max-wait', default=300.0, help='Seconds a lookup may wait for the Edamam rate limit')
+def ingest_recipes(input_path, output, batch_size, concurrency, max_wait):
+    """Build the per-recipe nutrition table from scraped recipes"""
+    output = Path(output or settings.RECIPE_NUTRITION_TABLE)
+    edamam_service = EdamamService()
+    if edamam_service.rate_limiter is not None:
+        # A bulk run would rather wait for its turn than fail lines
+        edamam_service.rate_limiter.max_wait = max_wait
+    ingester = RecipeNutritionIngester(edamam_service, batch_size=batch_size, concurrency=concurrency)
+
+    async def run():
+        await edamam_service.start()
+        try:
+            # Records go to disk batch by batch; the table replaces the old one only once all are in
+            with TableWriter(output) as writer:
+                async for recipe in ingester.ingest(iter_rows(input_path)):
+                    writer.add(recipe)
+            return writer.count
+        finally:
+            await edamam_service.close()
+
+    count = asyncio.run(run())
+    stats = ingester.stats
+    print(f"Wrote nutrition for {count} recipes to {output}")
+    print(f"Ingredient lines: {stats['lines']} ({stats['unique_lines']} distinct, {stats['failed_lines']} failed lookups)")
+    print(f"Nutrition cache: {edamam_service.cache.get_stats()}")
+
+if __name__ == '__main__':
+    ingest_recipes()
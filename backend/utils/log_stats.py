@@ -0,0 +1,303 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import gzip
+import json
+import math
+import os
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib decoder
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (log-spaced bins).
+
+    A value v lands in bin ceil(log(v) / log(gamma)), so any quantile is
+    reported within relative_accuracy of the true value. Two sketches merge
+    by adding their bin counts, which is what lets per-hour and per-key
+    aggregates be combined after the fact.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero = 0  # Values too small to bin (<= 1 microsecond)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 1e-6:
+            self.zero += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def merge(self, other: "QuantileSketch"):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"bins": {str(index): count for index, count in self.bins.items()}, "zero": self.zero,
+                "count": self.count, "total": self.total,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], relative_accuracy: float = 0.01) -> "QuantileSketch":
+        sketch = cls(relative_accuracy)
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        sketch.zero = data["zero"]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+class LogAggregates:
+    """Rolling aggregates over logs/request_logs.jsonl, resumable from a saved byte offset.
+
+    Durations are kept as one sketch per (hour, event type) and per
+    (hour, event type, cache key), so reports for any window of whole
+    hours are a merge of the matching sketches. Token counts are summed
+    per hour. The state (file identity, offset, aggregates) is saved as
+    JSON between runs; hours older than retention_hours are pruned. When
+    the log has been rotated, the rest of the rotated file is read before
+    the new one.
+    """
+
+    STATE_VERSION = 1
+
+    def __init__(self, log_file: Path, state_file: Path, retention_hours: int = 24 * 30):
+        self.log_file = log_file
+        self.state_file = state_file
+        self.retention_hours = retention_hours
+        self.inode: Optional[int] = None
+        self.offset = 0
+        self.mtime: Optional[float] = None  # Of the log file when last read; finds it again once rotated
+        # hour ("YYYY-MM-DDTHH") -> {"types": {type: sketch}, "keys": {(type, key): sketch}, "tokens": {...}}
+        self.hours: Dict[str, Dict[str, Any]] = {}
+        self.skipped_lines = 0
+
+    # State
+
+    def load_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Ignoring unreadable stats state: {str(e)}")
+            return
+        if state.get("version") != self.STATE_VERSION or state.get("log_file") != str(self.log_file):
+            return
+        self.inode = state["inode"]
+        self.offset = state["offset"]
+        self.mtime = state.get("mtime")
+        self.skipped_lines = state.get("skipped_lines", 0)
+        for hour, data in state["hours"].items():
+            self.hours[hour] = {
+                "types": {t: QuantileSketch.from_dict(s) for t, s in data["types"].items()},
+                "keys": {tuple(k.split("|", 1)): QuantileSketch.from_dict(s) for k, s in data["keys"].items()},
+                "tokens": data.get("tokens", {})
+            }
+
+    def save_state(self):
+        state = {
+            "version": self.STATE_VERSION,
+            "log_file": str(self.log_file),
+            "inode": self.inode,
+            "offset": self.offset,
+            "mtime": self.mtime,
+            "skipped_lines": self.skipped_lines,
+            "hours": {
+                hour: {
+                    "types": {t: s.to_dict() for t, s in data["types"].items()},
+                    "keys": {"|".join(k): s.to_dict() for k, s in data["keys"].items()},
+                    "tokens": data["tokens"]
+                }
+                for hour, data in self.hours.items()
+            }
+        }
+        tmp_path = self.state_file.with_name(f".{self.state_file.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, self.state_file)
+
+    # Ingestion
+
+    def update(self) -> int:
+        """Read entries appended since the saved offset; returns how many were added"""
+        try:
+            stat = self.log_file.stat()
+        except FileNotFoundError:
+            return 0
+        added = 0
+        # The new file can reuse the inode of a rotated file that was compressed and unlinked,
+        # so rotations are found by the rotated files themselves
+        rotated = self._rotated_since()
+        if rotated or stat.st_ino != self.inode:
+            # Rotated: finish the old file from the saved offset, then read the new one from the start
+            added += self._read_rotated(rotated)
+            self.inode = stat.st_ino
+            self.offset = 0
+        elif stat.st_size < self.offset:
+            self.offset = 0  # Truncated in place; earlier aggregates are kept
+
+        with open(self.log_file, 'rb') as f:
+            added += self._read(f)
+        self.mtime = stat.st_mtime
+        self._prune()
+        return added
+
+    def _read(self, f, final: bool = False) -> int:
+        added = 0
+        f.seek(self.offset)
+        for line in f:
+            if not final and not line.endswith(b"\n"):
+                break  # Partly written entry; picked up on the next run
+            self.offset += len(line)
+            if self._add_line(line):
+                added += 1
+        return added
+
+    def _rotated_since(self) -> List[str]:
+        """Names of the files RequestLogger rotated away since the last run, oldest first.
+
+        Rotated files are named stem-<mtime stamp>-<pid>[-n].jsonl[.gz], so
+        the file read last time is the first one stamped at or after its
+        saved mtime.
+        """
+        if self.inode is None or self.mtime is None:
+            return []
+        since = datetime.fromtimestamp(self.mtime).strftime("%Y%m%d-%H%M%S-%f")
+        prefix, suffix = f"{self.log_file.stem}-", self.log_file.suffix
+        names = set()
+        for path in self.log_file.parent.glob(f"{prefix}*"):
+            name = path.name[:-len(".gz")] if path.name.endswith(".gz") else path.name
+            if name.endswith(suffix) and name[len(prefix):len(prefix) + len(since)] >= since:
+                names.add(name)
+        return sorted(names)
+
+    def _read_rotated(self, names: List[str]) -> int:
+        """Resume the first rotated file from the saved offset and read any later ones in full"""
+        added = 0
+        offset = self.offset
+        for name in names:
+            path = self.log_file.with_name(name)
+            # Prefer the plain file: while it exists its .gz copy may still be being written
+            for candidate, opener in ((path, open), (Path(f"{path}.gz"), gzip.open)):
+                try:
+                    with opener(candidate, 'rb') as f:
+                        self.offset = offset
+                        added += self._read(f, final=True)
+                    break
+                except FileNotFoundError:
+                    continue
+                except (OSError, EOFError) as e:
+                    print(f"Skipping unreadable rotated log {candidate}: {str(e)}")
+                    break
+            offset = 0
+        return added
+
+    def _add_line(self, line: bytes) -> bool:
+        try:
+            entry = _loads(line)
+            hour = entry["timestamp"][:13]
+            event_type = entry["type"]
+            duration = float(entry["duration_seconds"])
+        except (ValueError, KeyError, TypeError):
+            self.skipped_lines += 1
+            return False
+
+        data = self.hours.get(hour)
+        if data is None:
+            data = self.hours[hour] = {"types": {}, "keys": {}, "tokens": {}}
+        sketch = data["types"].get(event_type)
+        if sketch is None:
+            sketch = data["types"][event_type] = QuantileSketch()
+        sketch.add(duration)
+        key = (event_type, str(entry.get("cache_key")))
+        sketch = data["keys"].get(key)
+        if sketch is None:
+            sketch = data["keys"][key] = QuantileSketch()
+        sketch.add(duration)
+        tokens = entry.get("tokens")
+        if isinstance(tokens, dict):
+            for direction, count in tokens.items():
+                data["tokens"][direction] = data["tokens"].get(direction, 0) + (count or 0)
+        return True
+
+    def _prune(self, now: Optional[datetime] = None):
+        """Drop hours older than now - retention_hours"""
+        if not self.hours or not self.retention_hours:
+            return
+        cutoff = ((now or datetime.now()) - timedelta(hours=self.retention_hours)).strftime("%Y-%m-%dT%H")
+        for hour in [hour for hour in self.hours if hour < cutoff]:
+            del self.hours[hour]
+
+    # Queries
+
+    def _hours_in(self, since: Optional[str], until: Optional[str]):
+        for hour, data in self.hours.items():
+            if since is not None and hour < since[:13]:
+                continue
+            if until is not None and hour > until[:13]:
+                continue
+            yield data
+
+    def by_type(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, QuantileSketch]:
+        result: Dict[str, QuantileSketch] = {}
+        for data in self._hours_in(since, until):
+            for event_type, sketch in data["types"].items():
+                result.setdefault(event_type, QuantileSketch()).merge(sketch)
+        return result
+
+    def by_key(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[tuple, QuantileSketch]:
+        result: Dict[tuple, QuantileSketch] = {}
+        for data in self._hours_in(since, until):
+            for key, sketch in data["keys"].items():
+                result.setdefault(key, QuantileSketch()).merge(sketch)
+        return result
+
+    def tokens(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        result: Dict[str, int] = {}
+        for data in self._hours_in(since, until):
+            for direction, count in data["tokens"].items():
+                result[direction] = result.get(direction, 0) + count
+        return result
@@ -0,0 +1,39 @@
+from pathlib import Path
+import json
+import click
+from services.cache_backends import JsonFileBackend, SQLiteBackend
+
+@click.command()
+@click.option('--cache-dir', default='cache', help='Directory holding the <key>_v<n>.json cache files')
+@click.option('--sqlite-path', default='cache/plans.sqlite3', help='SQLite store to migrate into')
+@click.option('--delete-json', is_flag=True, help='Remove the JSON files after they are migrated')
+def migrate_cache(cache_dir, sqlite_path, delete_json):
+    """Migrate cached meal plans from cache/*.json into the SQLite store"""
+    source = JsonFileBackend(Path(cache_dir))
+    target = SQLiteBackend(Path(sqlite_path))
+
+    migrated = 0
+    skipped = 0
+    for (cache_key, variation), meta in sorted(source.list_entries().items()):
+        raw = source.read(cache_key, variation)
+        if raw is None:
+            skipped += 1
+            continue
+        try:
+            # Re-encode compactly; validation status carries over from the metadata
+            body = json.dumps(json.loads(raw), separators=(",", ":")).encode()
+        except json.JSONDecodeError:
+            print(f"Skipping corrupted cache file: {cache_key}_v{variation}")
+            skipped += 1
+            continue
+        target.put(cache_key, variation, body, meta)
+        migrated += 1
+        if delete_json:
+            source.delete(cache_key, variation)
+
+    print(f"Migrated {migrated} cached plans to {sqlite_path} ({skipped} skipped)")
+    if migrated and not delete_json:
+        print("Set PLAN_CACHE_BACKEND=sqlite to serve from the new store")
+
+if __name__ == '__main__':
+    migrate_cache()
@@ -0,0 +1,41 @@
+import asyncio
+import click
+from services.openai_service import OpenAIService
+
+@click.command()
+@click.option('--max-keys', type=int, default=None, help='Most cache keys to warm (default: PREWARM_MAX_KEYS)')
+@click.option('--token-budget', type=int, default=None, help='OpenAI tokens to spend (default: PREWARM_TOKEN_BUDGET)')
+@click.option('--concurrency', type=int, default=None, help='Generations run at once (default: PREWARM_CONCURRENCY)')
+@click.option('--ignore-window', is_flag=True, help='Run outside the off-peak window')
+@click.option('--dry-run', is_flag=True, help='Only list the keys that would be warmed')
+def prewarm_cache(max_keys, token_budget, concurrency, ignore_window, dry_run):
+    """Fill the plan cache for frequently requested params from logs/request_logs.jsonl"""
+    service = OpenAIService()
+    warmer = service.cache_warmer
+    if max_keys is not None:
+        warmer.max_keys = max_keys
+    if token_budget is not None:
+        warmer.token_budget = token_budget
+    if concurrency is not None:
+        warmer.concurrency = concurrency
+
+    async def run():
+        await service.request_logger.start()
+        try:
+            return await warmer.run_once(ignore_window=ignore_window, dry_run=dry_run)
+        finally:
+            await service.request_logger.stop()
+            await service.llm.close()
+
+    report = asyncio.run(run())
+    if "skipped" in report:
+        print(f"Skipped: {report['skipped']} (use --ignore-window to run anyway)")
+        return
+    for cache_key, score, missing in report.get("keys", []):
+        print(f"{cache_key}  score={score}  missing={missing}")
+    print(f"Candidates: {report['candidates']}, variations planned: {report['planned']}")
+    if not dry_run:
+        print(f"Generated: {report['generated']}, failed: {report['failed']}, tokens: {report['tokens']}")
+
+if __name__ == '__main__':
+    prewarm_cache()
@@ -0,0 +1,105 @@
+"""Helpers shared by the benchmark scripts"""
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+import json
+import os
+import platform
+import subprocess
+import sys
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Settings the backend needs at import time; the upstreams are stubs, so the values are never sent anywhere real
+STUB_ENV = {"OPENAI_API_KEY": "stub", "EDAMAM_APP_ID": "stub", "EDAMAM_APP_KEY": "stub"}
+
+def percentiles(samples: Iterable[float], unit: str = "ms") -> Dict[str, Any]:
+    """Count, mean and p50/p95/p99/max of durations in seconds, reported in ms (or us)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    scale = 1e6 if unit == "us" else 1e3
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 3)
+
+    return {
+        "count": len(ordered),
+        f"mean_{unit}": round(sum(ordered) / len(ordered) * scale, 3),
+        f"p50_{unit}": pick(0.50),
+        f"p95_{unit}": pick(0.95),
+        f"p99_{unit}": pick(0.99),
+        f"max_{unit}": round(ordered[-1] * scale, 3)
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_metadata(args) -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args)
+    }
+
+def write_results(kind: str, results: Dict[str, Any], output: Optional[str] = None) -> Path:
+    """Save results as JSON under benchmarks/results/ (or output); returns the path"""
+    if output:
+        path = Path(output)
+    else:
+        path = RESULTS_DIR / f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def _children(pid: int):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident memory of a process and its children (uvicorn workers), or None where unsupported"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+        except psutil.Error:
+            return None
+    if not os.path.exists(f"/proc/{pid}"):
+        return None
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        total += _rss(current)
+        pending.extend(_children(current))
+    return total
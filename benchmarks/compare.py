@@ -0,0 +1,60 @@
+"""Compare two benchmark result files (both microbench or both loadtest).
+
+    python benchmarks/compare.py results/microbench-A.json results/microbench-B.json
+"""
+import argparse
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+MICROBENCH_FIELDS = ("ops_per_s", "p50_us", "p99_us")
+LOADTEST_FIELDS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "lag_mean_ms", "rss_peak_mb")
+
+def _rows(results: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    if results["benchmark"] == "microbench":
+        return {row["name"]: row for row in results["results"]}
+    rows = {}
+    for level in results["levels"]:
+        rows[f"concurrency={level['concurrency']}"] = {
+            "throughput_rps": level["throughput_rps"],
+            **{field: level["latency"].get(field) for field in ("p50_ms", "p95_ms", "p99_ms")},
+            "lag_mean_ms": level["event_loop_lag"].get("mean_ms"),
+            "rss_peak_mb": level["memory_rss_mb"]["peak"]
+        }
+    return rows
+
+def _change(before: Optional[float], after: Optional[float]) -> str:
+    if not before or after is None:
+        return ""
+    return f"{(after - before) / before * 100:+.1f}%"
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> List[Tuple[str, str, Any, Any, str]]:
+    if baseline["benchmark"] != candidate["benchmark"]:
+        raise SystemExit(f"Cannot compare {baseline['benchmark']} with {candidate['benchmark']} results")
+    fields = MICROBENCH_FIELDS if baseline["benchmark"] == "microbench" else LOADTEST_FIELDS
+    before_rows, after_rows = _rows(baseline), _rows(candidate)
+    table = []
+    for name in before_rows:
+        if name not in after_rows:
+            continue
+        for field in fields:
+            before, after = before_rows[name].get(field), after_rows[name].get(field)
+            table.append((name, field, before, after, _change(before, after)))
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline['meta']['git']} ({baseline['meta']['timestamp']})")
+    print(f"candidate: {candidate['meta']['git']} ({candidate['meta']['timestamp']})")
+    for name, field, before, after, change in compare(baseline, candidate):
+        print(f"{name:<30} {field:<16} {str(before):>12} -> {str(after):<12} {change}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""End-to-end load test of the backend under uvicorn, against the local upstream stubs.
+
+Starts benchmarks/stubs.py and the FastAPI app (in a scratch working
+directory, so the real cache and logs are untouched), warms a set of
+hot requests, then runs closed-loop clients at each concurrency level
+for --duration seconds. Each request is drawn from --mix and is a hit
+(one of the warmed hot requests) with probability --hit-ratio,
+otherwise a new request that misses every cache.
+
+Reported per level: throughput, p50/p95/p99 latency by request kind,
+status counts, event-loop lag (from the app's /metrics) and resident
+memory of the app processes.
+
+    python benchmarks/loadtest.py --concurrency 1,8,32 --duration 20 --hit-ratio 0.9
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+import httpx
+import stubs
+from common import BACKEND_DIR, STUB_ENV, percentiles, rss_bytes, run_metadata, write_results
+
+# Keep the run about the app, not the client-side limits, unless overridden with --env
+DEFAULT_APP_ENV = {
+    "OPENAI_RATE_LIMIT_PER_MINUTE": "1000000",
+    "OPENAI_RATE_LIMIT_BURST": "10000",
+    "EDAMAM_RATE_LIMIT_PER_MINUTE": "1000000",
+    "EDAMAM_RATE_LIMIT_BURST": "10000",
+    "RESCALE_ENABLED": "false",
+    "DISH_SOLVER_ENABLED": "false",
+    "PREWARM_ENABLED": "false",
+}
+
+_LAG_BUCKET_RE = re.compile(r'^foodscores_event_loop_lag_seconds_bucket\{le="([^"]+)"\} (\S+)$')
+_LAG_SUM_RE = re.compile(r'^foodscores_event_loop_lag_seconds_(sum|count) (\S+)$')
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+def parse_lag(metrics_text: str) -> Dict[str, Any]:
+    """Cumulative event-loop lag histogram from the app's /metrics"""
+    buckets = []
+    totals = {}
+    for line in metrics_text.splitlines():
+        match = _LAG_BUCKET_RE.match(line)
+        if match:
+            buckets.append((float(match.group(1).replace("+Inf", "inf")), float(match.group(2))))
+            continue
+        match = _LAG_SUM_RE.match(line)
+        if match:
+            totals[match.group(1)] = float(match.group(2))
+    return {"buckets": buckets, "sum": totals.get("sum", 0.0), "count": totals.get("count", 0.0)}
+
+def lag_summary(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Event-loop lag during a level; quantiles are histogram bucket upper bounds"""
+    count = after["count"] - before["count"]
+    if count <= 0:
+        return {"samples": 0}
+    previous = dict(before["buckets"])
+    deltas = [(bound, cumulative - previous.get(bound, 0.0)) for bound, cumulative in after["buckets"]]
+
+    def bound_for(q):
+        for bound, cumulative in deltas:
+            if cumulative >= q * count:
+                return None if bound == float("inf") else round(bound * 1000, 3)
+        return None
+
+    return {
+        "samples": int(count),
+        "mean_ms": round((after["sum"] - before["sum"]) / count * 1000, 3),
+        "p50_le_ms": bound_for(0.50),
+        "p99_le_ms": bound_for(0.99),
+    }
+
+class Workload:
+    """Draws requests: a kind from the mix, then a hot (cached) or a fresh (uncached) variant"""
+
+    def __init__(self, mix: Dict[str, float], hit_ratio: float, hot_keys: int, days: int, seed: Optional[int]):
+        self.mix = mix
+        self.hit_ratio = hit_ratio
+        self.days = days
+        self.random = random.Random(seed)
+        self._fresh = 0
+        self.hot = {
+            "meal-plan": [self._plan(1200 + 50 * i) for i in range(hot_keys)],
+            "food": [f"{10 * (i + 1)} g rice" for i in range(hot_keys)],
+        }
+
+    def _plan(self, calories: int) -> Dict[str, Any]:
+        return {"numberOfDays": self.days, "dailyCalories": calories, "healthConditions": [],
+                "cuisinePreferences": ["Indian"], "includeCheatMeal": False}
+
+    def request(self):
+        """(kind, hit, method, path, json body)"""
+        kind = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        hit = self.random.random() < self.hit_ratio
+        if hit:
+            value = self.random.choice(self.hot[kind])
+        else:
+            self._fresh += 1
+            # Fresh values sit far from the hot ones, so nothing is cached or derivable
+            value = self._plan(10_000 + self._fresh) if kind == "meal-plan" else f"{1000 + self._fresh} g lentils"
+        if kind == "meal-plan":
+            return kind, hit, "POST", "/api/meal-plan", value
+        return kind, hit, "GET", f"/api/{value}", None
+
+async def warm(client: httpx.AsyncClient, workload: Workload, variations: int):
+    """Fill the caches for every hot request (each plan up to `variations` cached variations)"""
+    semaphore = asyncio.Semaphore(16)
+
+    async def send(method, path, body, repeat=1):
+        # Repeats run one after another; concurrent misses on one key would share a generation
+        async with semaphore:
+            for _ in range(repeat):
+                await client.request(method, path, json=body)
+
+    requests = []
+    if workload.mix.get("meal-plan", 0) > 0:
+        requests.extend(send("POST", "/api/meal-plan", value, variations) for value in workload.hot["meal-plan"])
+    if workload.mix.get("food", 0) > 0:
+        requests.extend(send("GET", f"/api/{value}", None) for value in workload.hot["food"])
+    await asyncio.gather(*requests)
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, concurrency: int, duration: float,
+                    app_pid: int) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {}
+    memory = []
+    deadline = time.monotonic() + duration
+
+    async def user():
+        while time.monotonic() < deadline:
+            kind, hit, method, path, body = workload.request()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            samples.setdefault(f"{kind}:{'hit' if hit else 'miss'}", []).append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    async def sample_memory():
+        while time.monotonic() < deadline:
+            memory.append(rss_bytes(app_pid))
+            await asyncio.sleep(0.5)
+
+    lag_before = parse_lag((await client.get("/metrics")).text)
+    started = time.perf_counter()
+    await asyncio.gather(sample_memory(), *(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lag_after = parse_lag((await client.get("/metrics")).text)
+
+    all_samples = [value for values in samples.values() for value in values]
+    memory = [value for value in memory if value]
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "requests": len(all_samples),
+        "throughput_rps": round(len(all_samples) / elapsed, 2),
+        "statuses": statuses,
+        "latency": percentiles(all_samples),
+        "latency_by_kind": {name: percentiles(values) for name, values in sorted(samples.items())},
+        "event_loop_lag": lag_summary(lag_before, lag_after),
+        "memory_rss_mb": {
+            "peak": round(max(memory) / 2 ** 20, 1) if memory else None,
+            "end": round(memory[-1] / 2 ** 20, 1) if memory else None
+        }
+    }
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("meal-plan", "food"):
+            raise argparse.ArgumentTypeError(f"unknown request kind: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+def parse_env(values: List[str]) -> Dict[str, str]:
+    env = {}
+    for value in values:
+        key, _, setting = value.partition("=")
+        env[key] = setting
+    return env
+
+async def main_async(args) -> Dict[str, Any]:
+    stub_port = free_port()
+    app_port = free_port()
+    workdir = tempfile.mkdtemp(prefix="foodscores-bench-")
+    stub_args = [sys.executable, stubs.__file__, "--port", str(stub_port), "--latency", str(args.latency),
+                 "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+                 "--error-status", str(args.error_status), "--invalid-json-rate", str(args.invalid_json_rate)]
+    if args.edamam_latency is not None:
+        stub_args += ["--edamam-latency", str(args.edamam_latency)]
+    if args.seed is not None:
+        stub_args += ["--seed", str(args.seed)]
+
+    app_env = {
+        **os.environ,
+        **STUB_ENV,
+        **DEFAULT_APP_ENV,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "EDAMAM_BASE_URL": f"http://127.0.0.1:{stub_port}/api/nutrition-data",
+        **parse_env(args.env)
+    }
+    app_args = [sys.executable, "-m", "uvicorn", "app:app", "--app-dir", str(BACKEND_DIR), "--host", "127.0.0.1",
+                "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning"]
+    if args.no_access_log:
+        app_args.append("--no-access-log")
+
+    output = None if args.verbose else subprocess.DEVNULL
+    stub = subprocess.Popen(stub_args, stdout=output, stderr=output)
+    app = subprocess.Popen(app_args, cwd=workdir, env=app_env, stdout=output, stderr=output)
+    try:
+        await wait_ready(f"http://127.0.0.1:{stub_port}/stats", stub)
+        await wait_ready(f"http://127.0.0.1:{app_port}/", app)
+
+        workload = Workload(parse_mix(args.mix), args.hit_ratio, args.hot_keys, args.days, args.seed)
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 4,
+                              max_keepalive_connections=max(args.concurrency) + 4)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits,
+                                     timeout=args.timeout) as client:
+            print(f"Warming {args.hot_keys} hot requests per kind...")
+            warm_started = time.perf_counter()
+            await warm(client, workload, args.warm_variations)
+            print(f"Warm-up took {time.perf_counter() - warm_started:.1f}s")
+
+            levels = []
+            for concurrency in args.concurrency:
+                result = await run_level(client, workload, concurrency, args.duration, app.pid)
+                latency = result["latency"]
+                print(f"concurrency {concurrency:>4}: {result['throughput_rps']:>8} req/s  "
+                      f"p50 {latency.get('p50_ms')}ms  p95 {latency.get('p95_ms')}ms  p99 {latency.get('p99_ms')}ms  "
+                      f"lag p99 <= {result['event_loop_lag'].get('p99_le_ms')}ms  "
+                      f"rss {result['memory_rss_mb']['peak']}MB  statuses {result['statuses']}")
+                levels.append(result)
+            stub_stats = (await client.get(f"http://127.0.0.1:{stub_port}/stats")).json()
+    finally:
+        app.terminate()
+        stub.terminate()
+        for process in (app, stub):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {"benchmark": "loadtest", "meta": run_metadata(args), "levels": levels, "upstream_calls": stub_stats,
+            "workdir": workdir}
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend against local upstream stubs")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8, 32],
+                        help="Comma-separated client concurrency levels")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default="meal-plan=1,food=1", help="Request kinds and weights")
+    parser.add_argument("--hit-ratio", type=float, default=0.9, help="Share of requests for warmed (cached) params")
+    parser.add_argument("--hot-keys", type=int, default=20, help="Distinct warmed requests per kind")
+    parser.add_argument("--warm-variations", type=int, default=3, help="Generations per hot meal plan during warm-up")
+    parser.add_argument("--days", type=int, default=3, help="numberOfDays of the meal-plan requests")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Client timeout per request")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra backend setting, e.g. --env PLAN_CACHE_BACKEND=sqlite (repeatable)")
+    parser.add_argument("--no-access-log", action="store_true", help="Run uvicorn without its access log")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/loadtest-<time>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show stub and app output")
+    stubs.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(f"Results saved to {write_results('loadtest', results, args.output)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Microbenchmarks of the backend's hot paths, run in-process.
+
+    cache_key / params_hash   OpenAIService key generation
+    cache_lookup              _get_cached_response on a populated cache (json and sqlite backends)
+    cache_backend_read        one raw backend read, bypassing the in-memory LRU
+    validate_plan             plan_errors on the raw JSON of a cached plan
+    log_enqueue / log_write   RequestLogger.log, and writing a batch to the log file
+
+Everything runs in a scratch working directory, so the real cache and
+logs are untouched.
+
+    python benchmarks/microbench.py --iterations 20000
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from common import BACKEND_DIR, STUB_ENV, percentiles, run_metadata, write_results
+
+def bench(name: str, fn: Callable[[], Any], iterations: int, warmup: int = 100) -> Dict[str, Any]:
+    for _ in range(min(warmup, iterations)):
+        fn()
+    timings = []
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    for _ in range(iterations):
+        call_started = perf_counter()
+        fn()
+        timings.append(perf_counter() - call_started)
+    elapsed = perf_counter() - started
+    result = {"name": name, "ops_per_s": round(iterations / elapsed, 1), **percentiles(timings, unit="us")}
+    print(f"{name:<28} {result['ops_per_s']:>12} ops/s  p50 {result['p50_us']}us  p99 {result['p99_us']}us")
+    return result
+
+def sample_params(count: int, days: int) -> List[Dict[str, Any]]:
+    return [{"numberOfDays": days, "dailyCalories": 1200 + 10 * i, "healthConditions": ["diabetes"] if i % 3 else [],
+             "cuisinePreferences": ["Indian", "Italian"], "includeCheatMeal": bool(i % 2)} for i in range(count)]
+
+def run(args) -> List[Dict[str, Any]]:
+    import stubs
+    from config import settings
+    from models.food import plan_errors
+    from services.openai_service import OpenAIService
+    from services.request_logger import RequestLogger
+
+    results = []
+    params = sample_params(args.keys, args.days)
+    plans = [stubs.meal_plan(args.days, 1, p["dailyCalories"], "Indian") for p in params]
+
+    for backend in args.backends:
+        settings.PLAN_CACHE_BACKEND = backend
+        service = OpenAIService()
+        keys = [service._generate_cache_key(p) for p in params]
+        for key, p, plan in zip(keys, params, plans):
+            for _ in range(service.max_cache_per_params):
+                service._save_to_cache(key, plan, p)
+        # Every lookup is a hit, so the timing is the read path alone
+        service.cache_hit_randomization = 0
+
+        if backend == args.backends[0]:
+            param_cycle = itertools.cycle(params)
+            results.append(bench("cache_key", lambda: service._generate_cache_key(next(param_cycle)), args.iterations))
+            results.append(bench("params_hash", lambda: service._generate_params_hash(next(param_cycle)),
+                                 args.iterations))
+            raw_cycle = itertools.cycle([service.plan_cache.load_payload(key, 0).body for key in keys])
+            results.append(bench("validate_plan", lambda: plan_errors(
+                next(raw_cycle), macro_tolerance=settings.PLAN_MACRO_TOLERANCE), args.iterations // 4))
+
+        key_cycle = itertools.cycle(keys)
+        results.append(bench(f"cache_lookup[{backend}]", lambda: service._get_cached_response(next(key_cycle)),
+                             args.iterations))
+        entry_cycle = itertools.cycle([(key, variation) for key in keys
+                                       for variation in service.plan_cache.variations(key)])
+        storage = service.plan_cache.backend
+        results.append(bench(f"cache_backend_read[{backend}]", lambda: storage.read(*next(entry_cycle)),
+                             args.iterations // 4))
+
+    logger = RequestLogger(Path("logs"), batch_size=args.log_batch)
+    entry = {"timestamp": datetime.now().isoformat(), "cache_key": "0" * 32, "type": "cache_hit",
+             "duration_seconds": 0.0012, "params_hash": "1" * 32, "timings": {"cache_lookup": 0.0012}}
+    results.append(bench("log_enqueue", lambda: logger.log(dict(entry)), args.iterations))
+    logger._drain()
+    batch = [dict(entry) for _ in range(args.log_batch)]
+    result = bench(f"log_write[batch={args.log_batch}]", lambda: logger._write_batch(batch), args.iterations // 50)
+    result["entries_per_s"] = round(result["ops_per_s"] * args.log_batch, 1)
+    results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of cache, key, validation and log paths")
+    parser.add_argument("--iterations", type=int, default=20000, help="Calls per benchmark (fewer for slow paths)")
+    parser.add_argument("--keys", type=int, default=200, help="Distinct cached plans")
+    parser.add_argument("--days", type=int, default=7, help="Days per plan")
+    parser.add_argument("--backends", type=lambda v: v.split(","), default=["json", "sqlite"])
+    parser.add_argument("--log-batch", type=int, default=100, help="Entries per log write")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/microbench-<time>.json)")
+    args = parser.parse_args()
+
+    for key, value in STUB_ENV.items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, str(BACKEND_DIR))
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="foodscores-microbench-")
+    os.chdir(workdir)  # The services keep cache/ and logs/ relative to the working directory
+
+    results = run(args)
+    path = write_results("microbench", {"benchmark": "microbench", "meta": run_metadata(args),
+                                        "results": results, "workdir": workdir}, output)
+    print(f"Results saved to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Local stand-ins for the OpenAI chat completions and Edamam nutrition-data APIs.
+
+One server answers both:
+
+    POST /v1/chat/completions   (OPENAI_BASE_URL=http://127.0.0.1:<port>/v1)
+    GET  /api/nutrition-data    (EDAMAM_BASE_URL=http://127.0.0.1:<port>/api/nutrition-data)
+    GET  /stats                 request and injected-failure counts
+
+Meal plans are built from the numbers in the prompt, so they pass the
+backend's validation. Every response is delayed by --latency (plus
+uniform --jitter); --error-rate answers --error-status instead, and
+--invalid-json-rate returns a body that does not parse.
+
+    python benchmarks/stubs.py --port 8900 --latency 0.8 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from urllib.parse import parse_qs
+
+_DAYS_RE = re.compile(r"EXACTLY (\d+) days, numbered (\d+)")
+_CALORIES_RE = re.compile(r"EXACTLY (\d+) calories")
+_CUISINE_RE = re.compile(r"([A-Za-z][\w ]*?):\s*\d+")
+_QUANTITY_RE = re.compile(r"^\s*([\d.]+)\s*(g\b|grams?\b)?")
+
+MEAL_SHARES = (("breakfast", 0.25), ("lunch", 0.35), ("snack", 0.1), ("dinner", 0.3))
+
+class StubConfig:
+    def __init__(self, latency=0.5, jitter=0.0, error_rate=0.0, error_status=500, invalid_json_rate=0.0,
+                 edamam_latency=None, stream_chunk_chars=40, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.invalid_json_rate = invalid_json_rate
+        self.edamam_latency = latency if edamam_latency is None else edamam_latency
+        self.stream_chunk_chars = stream_chunk_chars
+        self.random = random.Random(seed)
+
+config = StubConfig()
+stats = {"openai": 0, "openai_stream": 0, "edamam": 0, "errors": 0, "invalid_json": 0}
+
+def meal_plan(num_days: int, first_day: int, calories: int, cuisine: str) -> dict:
+    days = []
+    for day in range(first_day, first_day + num_days):
+        meals = []
+        remaining = calories
+        for index, (meal_type, share) in enumerate(MEAL_SHARES):
+            meal_calories = remaining if index == len(MEAL_SHARES) - 1 else round(calories * share)
+            remaining -= meal_calories
+            meals.append({
+                "type": meal_type,
+                "name": f"{cuisine} {meal_type} {day}-{config.random.randint(1, 999)}",
+                "cuisine": cuisine,
+                "calories": meal_calories,
+                # 20/50/30 split of calories, at 4/4/9 kcal per gram
+                "nutrition": {"protein": f"{meal_calories * 0.2 / 4:.0f}g",
+                              "carbs": f"{meal_calories * 0.5 / 4:.0f}g",
+                              "fat": f"{meal_calories * 0.3 / 9:.0f}g"}
+            })
+        days.append({"day": day, "meals": meals, "total_calories": calories})
+    return {"meal_plan": days, "generation_time": 0}
+
+def plan_content(messages) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    days = _DAYS_RE.search(prompt)
+    calories = _CALORIES_RE.search(prompt)
+    cuisine = _CUISINE_RE.search(prompt.split("CUISINE DISTRIBUTION:")[-1])
+    plan = meal_plan(int(days.group(1)) if days else 1, int(days.group(2)) if days else 1,
+                     int(calories.group(1)) if calories else 2000, cuisine.group(1).strip() if cuisine else "Indian")
+    return "```json\n" + json.dumps(plan) + "\n```"
+
+def nutrition(ingredient: str) -> dict:
+    match = _QUANTITY_RE.match(ingredient)
+    # "100 g rice" weighs 100 g; any other quantity counts as 100 g per unit
+    grams = float(match.group(1)) * (1 if match.group(2) else 100) if match else 0.0
+    calories = round(grams * 1.3)
+    return {
+        "uri": f"stub:{ingredient}",
+        "calories": calories,
+        "totalWeight": grams,
+        "totalNutrients": {
+            "ENERC_KCAL": {"label": "Energy", "quantity": calories, "unit": "kcal"},
+            "PROCNT": {"label": "Protein", "quantity": grams * 0.05, "unit": "g"},
+            "FAT": {"label": "Fat", "quantity": grams * 0.02, "unit": "g"},
+            "CHOCDF": {"label": "Carbs", "quantity": grams * 0.25, "unit": "g"}
+        }
+    }
+
+def completion(content: str, model: str) -> dict:
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 600, "completion_tokens": len(content) // 4,
+                  "total_tokens": 600 + len(content) // 4}
+    }
+
+def stream_chunk(chunk_id: str, model: str, content=None, finish_reason=None) -> bytes:
+    delta = {"content": content} if content is not None else {}
+    body = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+    return b"data: " + json.dumps(body).encode() + b"\n\n"
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def _respond(send, status: int, body: bytes, content_type: bytes = b"application/json", headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+async def _delay(base: float):
+    await asyncio.sleep(max(0.0, base + config.random.uniform(0, config.jitter)))
+
+def _inject_failure():
+    """None, "error" or "invalid_json", drawn with the configured rates"""
+    draw = config.random.random()
+    if draw < config.error_rate:
+        stats["errors"] += 1
+        return "error"
+    if draw < config.error_rate + config.invalid_json_rate:
+        stats["invalid_json"] += 1
+        return "invalid_json"
+    return None
+
+async def _error(send):
+    headers = [(b"retry-after", b"1")] if config.error_status == 429 else []
+    await _respond(send, config.error_status, b'{"error": {"message": "stub failure"}}', headers=headers)
+
+async def chat_completions(receive, send):
+    request = json.loads(await _read_body(receive) or b"{}")
+    model = request.get("model", "stub")
+    failure = _inject_failure()
+    await _delay(config.latency)
+    if failure == "error":
+        return await _error(send)
+    content = plan_content(request.get("messages", []))
+    if failure == "invalid_json":
+        content = content[:len(content) // 2]  # A truncated plan, as from a cut-off completion
+
+    if not request.get("stream"):
+        stats["openai"] += 1
+        return await _respond(send, 200, json.dumps(completion(content, model)).encode())
+
+    stats["openai_stream"] += 1
+    chunk_id = f"chatcmpl-stub-{time.time_ns()}"
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+    size = config.stream_chunk_chars
+    for start in range(0, len(content), size):
+        await send({"type": "http.response.body", "body": stream_chunk(chunk_id, model, content[start:start + size]),
+                    "more_body": True})
+        await asyncio.sleep(0)
+    await send({"type": "http.response.body", "body": stream_chunk(chunk_id, model, finish_reason="stop"),
+                "more_body": True})
+    await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+
+async def nutrition_data(scope, send):
+    stats["edamam"] += 1
+    params = parse_qs(scope.get("query_string", b"").decode())
+    failure = _inject_failure()
+    await _delay(config.edamam_latency)
+    if failure == "error":
+        return await _error(send)
+    if failure == "invalid_json":
+        return await _respond(send, 200, b'{"calories": ')
+    await _respond(send, 200, json.dumps(nutrition(params.get("ingr", [""])[0])).encode())
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    path = scope["path"]
+    if path.endswith("/chat/completions") and scope["method"] == "POST":
+        return await chat_completions(receive, send)
+    if path.endswith("/nutrition-data"):
+        return await nutrition_data(scope, send)
+    if path == "/stats":
+        return await _respond(send, 200, json.dumps(stats).encode())
+    await _respond(send, 404, b'{"error": "not found"}')
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Extra uniform random delay, seconds")
+    parser.add_argument("--edamam-latency", type=float, default=None, help="Edamam delay (default: --latency)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="Share of responses that do not parse")
+    parser.add_argument("--seed", type=int, default=None)
+
+def configure(args):
+    global config
+    config = StubConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        error_status=args.error_status, invalid_json_rate=args.invalid_json_rate,
+                        edamam_latency=args.edamam_latency, seed=args.seed)
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub OpenAI and Edamam servers for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", lifespan="on")
+
+if __name__ == "__main__":
+    main()
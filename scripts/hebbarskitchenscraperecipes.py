@@ -1,68 +1,447 @@
-import requests
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+import httpx
 from bs4 import BeautifulSoup
-import pandas as pd
 
-# Function to scrape recipe links from a single page
-def scrape_recipe_links(page_url):
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only needed for .parquet output
+    pa = None
+
+BASE_URL = "https://hebbarskitchen.com/recipes/south-indian-dosa-recipes/"
+FIELDS = ["Title", "Ingredients", "Instructions", "URL"]
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+USER_AGENT = "FoodScoresRecipeCrawler/1.0"
+
+# Function to extract recipe links from a listing page
+def parse_recipe_links(html):
     recipe_links = []
-    response = requests.get(page_url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.content, "html.parser")
-        # Find all <a> tags with rel="bookmark"
-        link_elements = soup.find_all("a", attrs={"rel": "bookmark"})
-        for link in link_elements:
-            href = link.get("href")
-            if href:
-                recipe_links.append(href)
-    else:
-        print(f"Failed to fetch page: {page_url}. Status code: {response.status_code}")
+    soup = BeautifulSoup(html, "html.parser")
+    # Find all <a> tags with rel="bookmark"
+    link_elements = soup.find_all("a", attrs={"rel": "bookmark"})
+    for link in link_elements:
+        href = link.get("href")
+        if href:
+            recipe_links.append(href)
     return recipe_links
 
-# Function to scrape details of each recipe
-def scrape_recipe_details(recipe_url):
+# Function to extract the details of a recipe page
+def parse_recipe_details(html):
     recipe_data = {}
-    response = requests.get(recipe_url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.content, "html.parser")
-        # Extract recipe title
-        title = soup.find("h1", class_="entry-title")
-        recipe_data["Title"] = title.text.strip() if title else "No title found"
-
-        # Extract ingredients
-        ingredients_section = soup.find("div", class_="wprm-recipe-ingredients-container")
-        ingredients = [item.text.strip() for item in ingredients_section.find_all("li")] if ingredients_section else []
-        recipe_data["Ingredients"] = ", ".join(ingredients)
-
-        # Extract instructions
-        instructions_section = soup.find("div", class_="wprm-recipe-instructions-container")
-        instructions = [step.text.strip() for step in instructions_section.find_all("div", class_="wprm-recipe-instruction-text")] if instructions_section else []
-        recipe_data["Instructions"] = " ".join(instructions)
-    else:
-        print(f"Failed to fetch recipe page: {recipe_url}. Status code: {response.status_code}")
+    soup = BeautifulSoup(html, "html.parser")
+    # Extract recipe title
+    title = soup.find("h1", class_="entry-title")
+    recipe_data["Title"] = title.text.strip() if title else "No title found"
+
+    # Extract ingredients
+    ingredients_section = soup.find("div", class_="wprm-recipe-ingredients-container")
+    ingredients = [" ".join(item.text.split()) for item in ingredients_section.find_all("li")] if ingredients_section else []
+    # One ingredient per line; commas also occur inside lines ("1 onion, finely chopped")
+    recipe_data["Ingredients"] = "\n".join(line for line in ingredients if line)
+
+    # Extract instructions
+    instructions_section = soup.find("div", class_="wprm-recipe-instructions-container")
+    instructions = [step.text.strip() for step in instructions_section.find_all("div", class_="wprm-recipe-instruction-text")] if instructions_section else []
+    recipe_data["Instructions"] = " ".join(instructions)
     return recipe_data
 
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta seconds or an HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HttpCache:
+    """Fetched pages on disk, revalidated with If-None-Match / If-Modified-Since"""
+
+    def __init__(self, cache_dir: Path, max_age: float = 0):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age  # Entries younger than this are used without asking the server
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        return self.cache_dir / f"{digest}.html", self.cache_dir / f"{digest}.json"
+
+    def get(self, url: str) -> Optional[Tuple[Dict, bytes]]:
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            return meta, body_path.read_bytes()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def is_fresh(self, meta: Dict) -> bool:
+        return time.time() - meta.get("fetched_at", 0) < self.max_age
+
+    def validators(self, meta: Dict) -> Dict[str, str]:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def put(self, url: str, response: httpx.Response):
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched_at": time.time()
+        }
+        # Body first, so a meta file always points at a complete body
+        self._write(body_path, response.content)
+        self._write(meta_path, json.dumps(meta).encode())
+
+    def touch(self, url: str, meta: Dict):
+        meta["fetched_at"] = time.time()
+        self._write(self._paths(url)[1], json.dumps(meta).encode())
+
+    def _write(self, path: Path, data: bytes):
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+class HostLimiter:
+    """Per-host concurrency limit plus a minimum gap between request starts"""
+
+    def __init__(self, concurrency: int, delay: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Hold back new requests to this host, e.g. after a Retry-After"""
+        self._next_start = max(self._next_start, time.monotonic() + seconds)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self.delay
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+class Checkpoint:
+    """Append-only list of recipe URLs already written to the output"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done = set()
+        if path.exists():
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["url"])
+                    except (ValueError, KeyError):
+                        continue  # Partly written last line
+        self._file = open(path, 'a')
+
+    def mark(self, urls: List[str]):
+        for url in urls:
+            self._file.write(json.dumps({"url": url}) + "\n")
+            self.done.add(url)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class CsvRowWriter:
+    """Appends rows to a CSV file as they arrive"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        new_file = not path.exists() or path.stat().st_size == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+        if new_file:
+            self._writer.writeheader()
+
+    def write(self, row: Dict[str, str]) -> List[str]:
+        """Write one row; returns the URLs now safely on disk"""
+        self._writer.writerow(row)
+        self._file.flush()
+        return [row["URL"]]
+
+    def urls_on_disk(self) -> Set[str]:
+        """URLs of the rows already in the file"""
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            return {row["URL"] for row in csv.DictReader(f) if row.get("URL")}
+
+    def close(self) -> List[str]:
+        self._file.close()
+        return []
+
+class ParquetRowWriter:
+    """Writes rows as a directory of Parquet part files, one per batch_size rows.
+
+    Each part is complete once written, so an interrupted run loses at
+    most the unwritten batch; pandas.read_parquet reads the directory.
+    """
+
+    def __init__(self, path: Path, batch_size: int = 200):
+        if pa is None:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._rows: List[Dict[str, str]] = []
+        self._schema = pa.schema([(field, pa.string()) for field in FIELDS])
+
+    def write(self, row: Dict[str, str]) -> List[str]:
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            return self._flush()
+        return []
+
+    def urls_on_disk(self) -> Set[str]:
+        """URLs of the rows in finished part files"""
+        urls = set()
+        for part in self.path.glob("part-*.parquet"):
+            urls.update(pq.read_table(part, columns=["URL"]).column("URL").to_pylist())
+        return urls
+
+    def _flush(self) -> List[str]:
+        if not self._rows:
+            return []
+        table = pa.Table.from_pylist(self._rows, schema=self._schema)
+        part = self.path / f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{len(list(self.path.glob('part-*')))}.parquet"
+        tmp_path = part.with_name(f".{part.name}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, part)
+        urls = [row["URL"] for row in self._rows]
+        self._rows = []
+        return urls
+
+    def close(self) -> List[str]:
+        return self._flush()
+
+class RecipeCrawler:
+    """Fetches listing pages and recipe pages concurrently over one pooled client.
+
+    Requests to a host are limited to per_host at a time and spaced by
+    delay seconds; 429/5xx answers and connection errors are retried
+    with backoff, honouring Retry-After. Pages are kept in an HttpCache,
+    and recipes already in the checkpoint are skipped, so an interrupted
+    run picks up where it stopped.
+    """
+
+    def __init__(self, http_cache: HttpCache, checkpoint: Checkpoint, writer, concurrency: int = 8,
+                 per_host: int = 4, delay: float = 0.5, timeout: float = 30.0, retries: int = 3):
+        self.http_cache = http_cache
+        self.checkpoint = checkpoint
+        self.writer = writer
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.retries = retries
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True
+        )
+        self._hosts: Dict[str, HostLimiter] = {}
+        self.stats = {"fetched": 0, "not_modified": 0, "cached": 0, "retries": 0, "failed": 0,
+                      "written": 0, "skipped": 0}
+
+    async def close(self):
+        await self.client.aclose()
+
+    def _limiter(self, url: str) -> HostLimiter:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = HostLimiter(self.per_host, self.delay)
+        return self._hosts[host]
+
+    async def fetch(self, url: str) -> Optional[bytes]:
+        """Page body from the cache or the server; None if it could not be fetched"""
+        cached = self.http_cache.get(url)
+        if cached is not None and self.http_cache.is_fresh(cached[0]):
+            self.stats["cached"] += 1
+            return cached[1]
+        headers = self.http_cache.validators(cached[0]) if cached is not None else {}
+        limiter = self._limiter(url)
+
+        for attempt in range(self.retries + 1):
+            backoff = min(60.0, 2 ** attempt)
+            try:
+                async with limiter:
+                    response = await self.client.get(url, headers=headers)
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            else:
+                if response.status_code == 304 and cached is not None:
+                    self.stats["not_modified"] += 1
+                    self.http_cache.touch(url, cached[0])
+                    return cached[1]
+                if response.status_code == 200:
+                    self.stats["fetched"] += 1
+                    self.http_cache.put(url, response)
+                    return response.content
+                error = f"status code {response.status_code}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+                retry_after = retry_after_seconds(response.headers.get("retry-after"))
+                if retry_after is not None:
+                    backoff = retry_after
+                    limiter.pause(retry_after)
+            if attempt < self.retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(backoff)
+
+        self.stats["failed"] += 1
+        print(f"Failed to fetch {url}: {error}")
+        return None
+
+    async def scrape_listing(self, base_url: str, max_pages: int) -> List[str]:
+        """Recipe links from all listing pages, in page order without duplicates"""
+        page_urls = [f"{base_url}page/{page}/" if page > 1 else base_url for page in range(1, max_pages + 1)]
+        pages = await asyncio.gather(*(self.fetch(url) for url in page_urls))
+        links = []
+        seen = set()
+        for page_url, html in zip(page_urls, pages):
+            if html is None:
+                continue
+            page_links = parse_recipe_links(html)
+            print(f"Found {len(page_links)} recipes on {page_url}")
+            for link in page_links:
+                if link not in seen:
+                    seen.add(link)
+                    links.append(link)
+        return links
+
+    async def scrape_recipe(self, url: str):
+        html = await self.fetch(url)
+        if html is None:
+            return
+        row = parse_recipe_details(html)
+        row["URL"] = url
+        self.checkpoint.mark(self.writer.write(row))
+        self.stats["written"] += 1
+
+    async def run(self, base_url: str, max_pages: int):
+        # Rows are written before they are checkpointed; an interrupt in between must not duplicate them
+        unmarked = self.writer.urls_on_disk() - self.checkpoint.done
+        if unmarked:
+            self.checkpoint.mark(sorted(unmarked))
+        links = await self.scrape_listing(base_url, max_pages)
+        pending = [link for link in links if link not in self.checkpoint.done]
+        self.stats["skipped"] = len(links) - len(pending)
+        print(f"Scraping {len(pending)} recipes ({self.stats['skipped']} already done)")
+
+        # A fixed pool of workers keeps memory flat however many links there are
+        queue: asyncio.Queue = asyncio.Queue()
+        for link in pending:
+            queue.put_nowait(link)
+
+        async def worker():
+            while True:
+                try:
+                    link = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self.scrape_recipe(link)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    print(f"Error scraping {link}: {str(e)}")
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            self.checkpoint.mark(self.writer.close())
+
+def open_writer(output: Path, batch_size: int):
+    if output.suffix == ".parquet":
+        return ParquetRowWriter(output, batch_size)
+    return CsvRowWriter(output)
+
 # Main function to scrape all recipes across pagination
 def main():
-    base_url = "https://hebbarskitchen.com/recipes/south-indian-dosa-recipes/"
-    current_page = 1
-    max_pages = 9  # Adjust based on the pagination range
-    all_recipes = []
-
-    print("Scraping recipe links across pages...")
-    while current_page <= max_pages:
-        page_url = f"{base_url}page/{current_page}/" if current_page > 1 else base_url
-        print(f"Scraping page {current_page}: {page_url}")
-        recipe_links = scrape_recipe_links(page_url)
-        for link in recipe_links:
-            print(f"Scraping recipe: {link}")
-            recipe = scrape_recipe_details(link)
-            all_recipes.append(recipe)
-        current_page += 1
-
-    # Save to a CSV file
-    df = pd.DataFrame(all_recipes)
-    df.to_csv("hebbars_kitchen_recipes_paginated.csv", index=False)
-    print("Scraping completed. Recipes saved to 'hebbars_kitchen_recipes_paginated.csv'.")
+    parser = argparse.ArgumentParser(description="Scrape Hebbar's Kitchen recipes into a CSV or Parquet file")
+    parser.add_argument("--base-url", default=BASE_URL, help="Listing page; page N is <base-url>page/N/")
+    parser.add_argument("--max-pages", type=int, default=9, help="Listing pages to scrape")
+    parser.add_argument("--output", default="hebbars_kitchen_recipes_paginated.csv",
+                        help="Output file; a .parquet path is written as a directory of part files")
+    parser.add_argument("--checkpoint", default=None, help="Resume file (default: <output>.checkpoint.jsonl)")
+    parser.add_argument("--cache-dir", default=".http_cache", help="On-disk HTTP cache")
+    parser.add_argument("--cache-max-age", type=float, default=0,
+                        help="Seconds a cached page is used without revalidating it")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests overall")
+    parser.add_argument("--per-host", type=int, default=4, help="Concurrent requests per host")
+    parser.add_argument("--delay", type=float, default=0.5, help="Minimum seconds between requests to a host")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=200, help="Rows per Parquet part file")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start a new output")
+    args = parser.parse_args()
+
+    output = Path(args.output)
+    checkpoint_path = Path(args.checkpoint or f"{args.output}.checkpoint.jsonl")
+    if args.restart:
+        checkpoint_path.unlink(missing_ok=True)
+        if output.is_dir():
+            for part in output.glob("part-*.parquet"):
+                part.unlink()
+        else:
+            output.unlink(missing_ok=True)
+
+    async def run():
+        crawler = RecipeCrawler(
+            HttpCache(Path(args.cache_dir), max_age=args.cache_max_age),
+            Checkpoint(checkpoint_path),
+            open_writer(output, args.batch_size),
+            concurrency=args.concurrency,
+            per_host=args.per_host,
+            delay=args.delay,
+            timeout=args.timeout,
+            retries=args.retries
+        )
+        try:
+            await crawler.run(args.base_url, args.max_pages)
+        finally:
+            await crawler.close()
+            crawler.checkpoint.close()
+        return crawler.stats
+
+    started = time.perf_counter()
+    try:
+        stats = asyncio.run(run())
+    except KeyboardInterrupt:
+        print(f"Interrupted. Rows written so far are in '{output}'; run again to resume.")
+        return
+    print(f"Scraping completed in {time.perf_counter() - started:.1f}s. Recipes saved to '{output}'.")
+    print(", ".join(f"{name}: {count}" for name, count in stats.items()))
 
 if __name__ == "__main__":
     main()
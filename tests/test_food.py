@@ -0,0 +1,40 @@
+import json
+import pytest
+from models.food import day_errors, parse_grams, plan_errors
+
+def meal(calories=500, protein="25g", carbs="62.5g", fat=17):
+    return {"type": "lunch", "name": "Thali", "cuisine": "Indian", "calories": calories,
+            "nutrition": {"protein": protein, "carbs": carbs, "fat": fat}}
+
+def day(number=1, meals=None, total=None):
+    meals = meals or [meal(), meal()]
+    return {"day": number, "meals": meals, "total_calories": sum(m["calories"] for m in meals) if total is None else total}
+
+@pytest.mark.parametrize("value, grams", [
+    ("20g", 20.0), ("20 g", 20.0), (" 20 ", 20.0), ("20.5g", 20.5), (7, 7.0), (2.5, 2.5),
+    ("20gg", None), ("g", None), ("", None), ("-3g", None), ("1e3", None), (".5g", None), ("²g", None), (None, None),
+])
+def test_parse_grams(value, grams):
+    assert parse_grams(value) == grams
+
+def test_valid_plan_has_no_errors():
+    plan = {"meal_plan": [day(1), day(2)]}
+    assert plan_errors(json.dumps(plan).encode(), daily_calories=1000, number_of_days=2, macro_tolerance=0.1) == []
+
+def test_bad_gram_amount_is_a_validation_error():
+    errors = plan_errors({"meal_plan": [day(meals=[meal(protein="lots")])]})
+    assert len(errors) == 1 and "nutrition.protein" in errors[0]
+
+def test_consistency_checks():
+    plan = {"meal_plan": [day(1, total=900), day(2, meals=[meal(fat="90g"), meal()])]}
+    errors = plan_errors(plan, daily_calories=1000, macro_tolerance=0.1)
+    assert any("add up to 1000, not 900" in error for error in errors)
+    assert any("out of range in day 1" in error for error in errors)
+    assert any("Macros of a meal in day 2" in error for error in errors)
+
+def test_day_errors_are_reported_per_day():
+    days = [day(1), day(2, meals=[meal(carbs="x")]), day(3, total=700)]
+    results = day_errors(days, daily_calories=1000)
+    assert results[0] == []
+    assert len(results[1]) == 1 and "carbs" in results[1][0]
+    assert len(results[2]) == 2
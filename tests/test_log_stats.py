@@ -0,0 +1,66 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from utils.log_stats import LogAggregates
+
+def entry(hour="2026-10-18T10", event_type="cache_hit", duration=0.5):
+    return json.dumps({"timestamp": f"{hour}:00:00", "type": event_type, "duration_seconds": duration,
+                       "cache_key": "k"}) + "\n"
+
+def append(path, count, **kwargs):
+    with open(path, 'a') as f:
+        f.write("".join(entry(**kwargs) for _ in range(count)))
+
+def rotate(path, compress):
+    # As RequestLogger does: rename to stem-<mtime stamp>-<pid>.jsonl, then gzip it
+    stamp = datetime.fromtimestamp(path.stat().st_mtime).strftime("%Y%m%d-%H%M%S-%f")
+    rotated = path.with_name(f"{path.stem}-{stamp}-{os.getpid()}{path.suffix}")
+    os.replace(path, rotated)
+    if compress:
+        with open(rotated, 'rb') as source, gzip.open(f"{rotated}.gz", 'wb') as target:
+            target.write(source.read())
+        rotated.unlink()
+
+def aggregates(tmp_path, **kwargs):
+    result = LogAggregates(tmp_path / "request_logs.jsonl", tmp_path / "state.json", **kwargs)
+    result.load_state()
+    return result
+
+def test_update_resumes_from_the_saved_offset(tmp_path):
+    log_file = tmp_path / "request_logs.jsonl"
+    append(log_file, 3)
+    first = aggregates(tmp_path, retention_hours=0)
+    assert first.update() == 3
+    first.save_state()
+
+    append(log_file, 2)
+    with open(log_file, 'a') as f:
+        f.write('{"timestamp": "2026')  # Partly written
+    second = aggregates(tmp_path, retention_hours=0)
+    assert second.update() == 2
+    assert second.by_type()["cache_hit"].count == 5
+
+def test_entries_written_before_rotation_are_not_lost(tmp_path):
+    log_file = tmp_path / "request_logs.jsonl"
+    for compress in (False, True):
+        append(log_file, 3)
+        stats = aggregates(tmp_path, retention_hours=0)
+        stats.update()
+        stats.save_state()
+        append(log_file, 2)  # Written after the last run, then rotated away
+        rotate(log_file, compress)
+        append(log_file, 4)
+
+        stats = aggregates(tmp_path, retention_hours=0)
+        assert stats.update() == 6
+        stats.save_state()
+    assert stats.by_type()["cache_hit"].count == 2 * 9
+
+def test_prune_drops_hours_older_than_retention(tmp_path):
+    now = datetime(2026, 10, 18, 12, 30)
+    stats = LogAggregates(tmp_path / "request_logs.jsonl", tmp_path / "state.json", retention_hours=24)
+    for hours_ago in (0, 5, 30, 24 * 7):
+        stats._add_line(entry((now - timedelta(hours=hours_ago)).strftime("%Y-%m-%dT%H")).encode())
+    stats._prune(now)
+    assert sorted(stats.hours) == ["2026-10-18T07", "2026-10-18T12"]
@@ -0,0 +1,63 @@
+import json
+import pytest
+from services.plan_stream import IncrementalPlanParser
+
+DAYS = [
+    {"day": 1, "meals": [{"type": "breakfast", "name": "Masala Dosa {spicy} [v2]", "cuisine": "Indian",
+                          "calories": 450, "nutrition": {"protein": "12g", "carbs": "60g", "fat": "15g"}}],
+     "total_calories": 450},
+    {"day": 2, "meals": [{"type": "lunch", "name": 'Chef\'s "special" \\ thali }]', "cuisine": "Indian",
+                          "calories": 700, "nutrition": {"protein": "25g", "carbs": "90g", "fat": "20g"}}],
+     "total_calories": 700},
+    {"day": 3, "meals": [{"type": "dinner", "name": "Café au lait — \"x\"\n", "cuisine": "French",
+                          "calories": 300, "nutrition": {"protein": "8g", "carbs": "30g", "fat": "12g"}}],
+     "total_calories": 300},
+]
+DOCUMENT = json.dumps({"meal_plan": DAYS, "generation_time": 0}, ensure_ascii=True, indent=2)
+
+def feed_chunks(chunks, parser=None):
+    parser = parser or IncrementalPlanParser()
+    days = []
+    for chunk in chunks:
+        days.extend(parser.feed(chunk))
+    return days
+
+def split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64, len(DOCUMENT)])
+def test_days_are_the_same_for_any_chunk_size(size):
+    assert feed_chunks(split_every(DOCUMENT, size)) == DAYS
+
+def test_chunk_boundary_anywhere_inside_strings_and_escapes():
+    # Every split point, including right after a backslash and inside \uXXXX escapes
+    for cut in range(1, len(DOCUMENT)):
+        assert feed_chunks([DOCUMENT[:cut], DOCUMENT[cut:]]) == DAYS, cut
+
+def test_days_are_returned_as_soon_as_they_close():
+    parser = IncrementalPlanParser()
+    closing_brace = DOCUMENT.index("}", DOCUMENT.index('"total_calories": 450'))
+    assert parser.feed(DOCUMENT[:closing_brace]) == []
+    assert parser.feed(DOCUMENT[closing_brace]) == DAYS[:1]
+
+@pytest.mark.parametrize("prefix, suffix", [
+    ("```json\n", "\n```"),
+    ("```\n", "```"),
+    ("Here is your plan:\n```json\n", "\n```\nEnjoy!"),
+])
+def test_fence_and_text_around_the_document_are_ignored(prefix, suffix):
+    assert feed_chunks(split_every(prefix + DOCUMENT + suffix, 4)) == DAYS
+
+def test_only_the_top_level_meal_plan_is_read():
+    document = json.dumps({
+        "meta": {"meal_plan": [{"day": 99}]},
+        "alternatives": [{"meal_plan": [{"day": 98}]}],
+        "note": "meal_plan",
+        "meal_plan": [{"day": 1, "meal_plan": [{"day": 97}], "meals": []}],
+        "extra": {"meal_plan": [{"day": 96}]},
+    })
+    assert feed_chunks(split_every(document, 3)) == [{"day": 1, "meal_plan": [{"day": 97}], "meals": []}]
+
+def test_malformed_day_raises():
+    with pytest.raises(json.JSONDecodeError):
+        feed_chunks(['{"meal_plan": [{"day": 1,}', ']}'])
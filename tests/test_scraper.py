@@ -0,0 +1,159 @@
+import asyncio
+import csv
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+pytest.importorskip("bs4")
+import hebbarskitchenscraperecipes as scraper
+
+PAGES = 2
+PER_PAGE = 5
+FLAKY_RECIPE = 3  # Answers 503 with Retry-After once
+
+class StubSite(BaseHTTPRequestHandler):
+    """Listing pages /recipes/page/N/ and recipe pages /r/N/, with ETags"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, time.monotonic()))
+        host = f"http://{self.headers['Host']}"
+        if self.path.startswith("/recipes/"):
+            page = int(self.path.split("/page/")[1].strip("/")) if "/page/" in self.path else 1
+            links = "".join(f'<a rel="bookmark" href="{host}/r/{(page - 1) * PER_PAGE + i}/">x</a>'
+                            for i in range(PER_PAGE))
+            body = f"<html>{links}</html>"
+        elif self.path.startswith("/r/"):
+            number = int(self.path.split("/")[2])
+            if number == FLAKY_RECIPE and not server.flaked:
+                server.flaked = True
+                return self._send(503, b"busy", {"Retry-After": "1"})
+            body = (f'<h1 class="entry-title">Dosa {number}</h1>'
+                    f'<div class="wprm-recipe-ingredients-container"><ul>'
+                    f'<li>1 cup rice</li><li>1 onion, finely chopped</li><li>salt to taste</li></ul></div>'
+                    f'<div class="wprm-recipe-instructions-container">'
+                    f'<div class="wprm-recipe-instruction-text">Soak.</div></div>')
+        else:
+            return self._send(404, b"not found", {})
+        etag = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", {"ETag": etag})
+        self._send(200, body.encode(), {"ETag": etag})
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSite)
+    server.requests = []
+    server.flaked = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.host_url = f"http://127.0.0.1:{server.server_port}"
+    server.base_url = f"{server.host_url}/recipes/"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def crawl(site, tmp_path, output_name="recipes.csv"):
+    output = tmp_path / output_name
+
+    async def run():
+        crawler = scraper.RecipeCrawler(
+            scraper.HttpCache(tmp_path / "http_cache"),
+            scraper.Checkpoint(tmp_path / f"{output_name}.checkpoint.jsonl"),
+            scraper.open_writer(output, batch_size=4),
+            concurrency=4, per_host=4, delay=0, timeout=5, retries=2
+        )
+        try:
+            await crawler.run(site.base_url, PAGES)
+        finally:
+            await crawler.close()
+            crawler.checkpoint.close()
+        return crawler.stats
+
+    return asyncio.run(run()), output
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def recipe_requests(site, number):
+    return [at for path, at in site.requests if path == f"/r/{number}/"]
+
+def test_crawl_writes_every_recipe_once_and_honours_retry_after(site, tmp_path):
+    stats, output = crawl(site, tmp_path)
+
+    rows = read_rows(output)
+    assert len(rows) == PAGES * PER_PAGE
+    assert len({row["URL"] for row in rows}) == len(rows)
+    assert rows[0]["Ingredients"].split("\n") == ["1 cup rice", "1 onion, finely chopped", "salt to taste"]
+    assert stats["retries"] == 1 and stats["failed"] == 0
+
+    first, second = recipe_requests(site, FLAKY_RECIPE)
+    assert second - first >= 0.9
+
+def test_rerun_revalidates_pages_and_skips_finished_recipes(site, tmp_path):
+    crawl(site, tmp_path)
+    site.requests.clear()
+
+    stats, output = crawl(site, tmp_path)
+
+    assert stats["skipped"] == PAGES * PER_PAGE and stats["written"] == 0
+    assert stats["not_modified"] == PAGES and stats["fetched"] == 0
+    assert all(path.startswith("/recipes/") for path, _ in site.requests)
+    assert len(read_rows(output)) == PAGES * PER_PAGE
+
+def test_resume_fetches_only_recipes_missing_from_the_checkpoint(site, tmp_path):
+    checkpoint = scraper.Checkpoint(tmp_path / "recipes.csv.checkpoint.jsonl")
+    done = [f"{site.host_url}/r/{n}/" for n in range(4)]
+    checkpoint.mark(done)
+    checkpoint.close()
+
+    stats, output = crawl(site, tmp_path)
+
+    assert stats["skipped"] == 4 and stats["written"] == PAGES * PER_PAGE - 4
+    assert all(not recipe_requests(site, n) for n in range(4))
+    assert {row["URL"] for row in read_rows(output)}.isdisjoint(done)
+
+def test_rows_written_but_not_checkpointed_are_not_duplicated(site, tmp_path):
+    crawl(site, tmp_path)
+    # As if the last run stopped between writing rows and checkpointing them
+    checkpoint_path = tmp_path / "recipes.csv.checkpoint.jsonl"
+    lines = checkpoint_path.read_text().splitlines()
+    checkpoint_path.write_text("\n".join(lines[:3]) + "\n")
+    site.requests.clear()
+
+    stats, output = crawl(site, tmp_path)
+
+    rows = read_rows(output)
+    assert len(rows) == len({row["URL"] for row in rows}) == PAGES * PER_PAGE
+    assert stats["written"] == 0
+    assert not any(path.startswith("/r/") for path, _ in site.requests)
+
+def test_parquet_parts_written_but_not_checkpointed_are_not_duplicated(site, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    crawl(site, tmp_path, "recipes.parquet")
+    (tmp_path / "recipes.parquet.checkpoint.jsonl").write_text("")
+
+    stats, output = crawl(site, tmp_path, "recipes.parquet")
+
+    urls = [url for part in output.glob("part-*.parquet")
+            for url in pq.read_table(part, columns=["URL"]).column("URL").to_pylist()]
+    assert len(urls) == len(set(urls)) == PAGES * PER_PAGE
+    assert stats["written"] == 0